@@ -0,0 +1,47 @@
+"""Сравнивает два прогона бенчмарков и падает на регрессиях.
+
+    python -m benchmarks.compare base.json new.json --threshold 0.2
+"""
+import argparse
+import json
+import sys
+
+METRICS = ('p50_ms', 'p95_ms', 'queries', 'peak_kb')
+
+
+def regressions(base, new, threshold):
+    for name, metrics in sorted(new['results'].items()):
+        before = base['results'].get(name)
+        if before is None:
+            continue
+        for metric in METRICS:
+            old, value = before[metric], metrics[metric]
+            if metric == 'queries':
+                worse = value > old
+            else:
+                worse = value > old * (1 + threshold)
+            yield name, metric, old, value, worse
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('base')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='допустимый рост времени и памяти, доля')
+    args = parser.parse_args(argv)
+    with open(args.base) as base_file, open(args.new) as new_file:
+        base, new = json.load(base_file), json.load(new_file)
+    if base['dataset'] != new['dataset']:
+        print('Внимание: прогоны сделаны на разных наборах данных.')
+    failed = False
+    for name, metric, old, value, worse in regressions(
+            base, new, args.threshold):
+        mark = 'РЕГРЕССИЯ' if worse else ''
+        print(f'{name:28} {metric:8} {old:>10} -> {value:<10} {mark}')
+        failed = failed or worse
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""Нагрузочный прогон всех публичных страниц.
+
+Запуск из корня репозитория:
+
+    BENCH_POSTS=20000 python -m pytest benchmarks
+
+Результаты пишутся в JSON (по умолчанию benchmarks/results/<commit>.json),
+два таких файла сравнивает `python -m benchmarks.compare old.json new.json`.
+"""
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from mixer.backend.django import mixer
+
+pytest_plugins = [
+    'tests.fixtures.fixture_user',
+    'tests.fixtures.fixture_data',
+]
+
+BENCH_POSTS = int(os.environ.get('BENCH_POSTS', 5000))
+BENCH_USERS = int(os.environ.get('BENCH_USERS', 200))
+BENCH_GROUPS = int(os.environ.get('BENCH_GROUPS', 20))
+BENCH_FOLLOWS = int(os.environ.get('BENCH_FOLLOWS', 30))
+BENCH_REQUESTS = int(os.environ.get('BENCH_REQUESTS', 50))
+BENCH_SEED = int(os.environ.get('BENCH_SEED', 43))
+
+RESULTS = {}
+
+
+def percentile(values, share):
+    """Перцентиль методом ближайшего ранга."""
+    ordered = sorted(values)
+    return ordered[max(0, round(share * len(ordered)) - 1)]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def seed():
+    """Детерминированный набор данных: те же строки на каждом коммите.
+
+    Посты и комментарии вставляются bulk_create, который не шлёт
+    сигналов, поэтому ленты подписок, поисковый индекс и счётчики
+    строятся теми же функциями, что вызывают сигналы и команды.
+    """
+    from django.contrib.auth import get_user_model
+    from posts.models import Comment, Follow, Group, Post
+    from posts.search import index_posts
+    from posts.stats import rebuild_group_stats, rebuild_stats
+    from posts.timeline import fan_out_many
+
+    mixer.faker.seed_instance(BENCH_SEED)
+    users = mixer.cycle(BENCH_USERS).blend(
+        get_user_model(), username=mixer.sequence('bench{0}'))
+    groups = mixer.cycle(BENCH_GROUPS).blend(
+        Group, slug=mixer.sequence('bench-{0}'))
+    reader = users[0]
+    for author in users[1:BENCH_FOLLOWS + 1]:
+        Follow.objects.create(user=reader, author=author)
+    with mixer.ctx(commit=False):
+        posts = mixer.cycle(BENCH_POSTS).blend(
+            Post,
+            author=(users[i % len(users)] for i in range(BENCH_POSTS)),
+            group=(groups[i % len(groups)] for i in range(BENCH_POSTS)),
+            image='')
+    Post.objects.bulk_create(posts)
+    # На SQLite bulk_create не проставляет pk: посты читаются заново.
+    posts = list(Post.objects.select_related('group').order_by('pk'))
+    fan_out_many(posts)
+    index_posts(posts)
+    post = Post.objects.order_by('-pub_date').first()
+    with mixer.ctx(commit=False):
+        comments = mixer.cycle(BENCH_REQUESTS).blend(
+            Comment, post=post, author=(u for u in users))
+    Comment.objects.bulk_create(comments)
+    rebuild_stats()
+    rebuild_group_stats()
+    return {'reader': reader, 'author': users[1], 'group': groups[0],
+            'post': post}
+
+
+@pytest.fixture(scope='session')
+def dataset(django_db_setup, django_db_blocker):
+    with django_db_blocker.unblock():
+        return seed()
+
+
+@pytest.fixture
+def bench(client):
+    """Прогоняет запрос BENCH_REQUESTS раз и запоминает метрики."""
+
+    def run(name, request, warm=True):
+        for _ in range(3):
+            request()
+        timings = []
+        queries = []
+        for _ in range(BENCH_REQUESTS):
+            if not warm:
+                cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = request()
+                timings.append(time.perf_counter() - started)
+            queries.append(len(captured))
+            assert response.status_code in (200, 302), name
+        if not warm:
+            cache.clear()
+        tracemalloc.start()
+        request()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        RESULTS[name] = {
+            'p50_ms': round(percentile(timings, 0.5) * 1000, 3),
+            'p95_ms': round(percentile(timings, 0.95) * 1000, 3),
+            'queries': max(queries),
+            'peak_kb': round(peak / 1024, 1),
+        }
+        return RESULTS[name]
+
+    return run
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if not RESULTS:
+        return
+    commit = git_commit()
+    path = os.environ.get('BENCH_OUTPUT') or os.path.join(
+        os.path.dirname(__file__), 'results', f'{commit}.json')
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    report = {
+        'commit': commit,
+        'python': platform.python_version(),
+        'dataset': {
+            'posts': BENCH_POSTS,
+            'users': BENCH_USERS,
+            'groups': BENCH_GROUPS,
+            'follows': BENCH_FOLLOWS,
+            'requests': BENCH_REQUESTS,
+            'seed': BENCH_SEED,
+        },
+        'results': dict(sorted(RESULTS.items())),
+    }
+    with open(path, 'w') as output:
+        json.dump(report, output, indent=2, ensure_ascii=False)
+    session.config.get_terminal_writer().line(
+        f'benchmark results: {path}')
@@ -0,0 +1,51 @@
+"""Рендер страницы из 10 постов без запросов к БД.
+
+Сравнивает {% url %} с {% cached_url %} на том же движке шаблонов, что
+в продакшене: без отладки Django сам оборачивает загрузчики в
+кэширующий, так что шаблоны разбираются один раз на процесс. Страница
+и пользователь готовятся заранее, в замер попадает только шаблон
+index.html вместе с base.html и включениями.
+"""
+import copy
+
+import pytest
+from django.conf import settings as django_settings
+from django.shortcuts import render
+from django.test import RequestFactory
+
+from core.templatetags import cached_urls
+from posts.models import Post
+from posts.utils import paginate
+
+pytestmark = [pytest.mark.django_db]
+
+PAGE_POSTS = 10
+
+
+def production_templates():
+    templates = copy.deepcopy(django_settings.TEMPLATES)
+    templates[0]['OPTIONS']['debug'] = False
+    return templates
+
+
+@pytest.fixture
+def page_request(dataset):
+    request = RequestFactory().get('/')
+    request.user = dataset['reader']
+    request.session = {}
+    page_obj = paginate(request, Post.objects.feed(), PAGE_POSTS)
+    list(page_obj)
+    return request, {'page_obj': page_obj, 'feed_key': 'bench',
+                     'feed_timeout': 0, 'index': True}
+
+
+@pytest.mark.parametrize('urls', ['url', 'cached_url'])
+def test_render_index(bench, settings, monkeypatch, page_request, urls):
+    settings.TEMPLATES = production_templates()
+    if urls == 'url':
+        # Каждый вызов считает reverse заново, как встроенный {% url %}.
+        monkeypatch.setattr(cached_urls, '_reverse',
+                            cached_urls._reverse.__wrapped__)
+    request, context = page_request
+    bench(f'render:index[{urls}]',
+          lambda: render(request, 'posts/index.html', context), warm=False)
@@ -0,0 +1,122 @@
+import pytest
+from django.urls import resolve, reverse
+from posts.models import Post
+from posts.utils import PAGE_FOR_LIST, encode_cursor
+
+pytestmark = [pytest.mark.django_db]
+
+FEEDS = ('index', 'group_posts', 'profile')
+
+
+def feed_url(name, dataset, namespace='posts'):
+    args = {
+        'index': [],
+        'group_posts': [dataset['group'].slug],
+        'profile': [dataset['author'].username],
+    }[name]
+    return reverse(f'{namespace}:{name}', args=args)
+
+
+@pytest.mark.parametrize('warm', [False, True], ids=['cold', 'warm'])
+@pytest.mark.parametrize('name', FEEDS)
+def test_feed(bench, client, dataset, name, warm):
+    url = feed_url(name, dataset)
+    label = f'{name}[{"warm" if warm else "cold"}]'
+    bench(label, lambda: client.get(url), warm=warm)
+
+
+def deep_cursor(name, dataset):
+    """Курсор перед последней страницей ленты, а не вторая страница."""
+    posts = {
+        'index': Post.objects.all(),
+        'group_posts': Post.objects.filter(group=dataset['group']),
+        'profile': Post.objects.filter(author=dataset['author']),
+    }[name].order_by('-pub_date', '-pk')
+    post = posts[max(0, posts.count() - PAGE_FOR_LIST - 1)]
+    return encode_cursor(post.pub_date, post.pk)
+
+
+@pytest.mark.parametrize('name', FEEDS)
+def test_feed_deep_page(bench, client, dataset, name):
+    url = f'{feed_url(name, dataset)}?after={deep_cursor(name, dataset)}'
+    assert client.get(url).context['page_obj'].object_list
+    bench(f'{name}[deep]', lambda: client.get(url), warm=False)
+
+
+def test_post_detail(bench, client, dataset):
+    url = reverse('posts:post_detail', args=[dataset['post'].pk])
+    bench('post_detail', lambda: client.get(url))
+
+
+def test_follow_index(bench, client, dataset):
+    client.force_login(dataset['reader'])
+    url = reverse('posts:follow_index')
+    assert client.get(url).context['page_obj'].object_list
+    bench('follow_index', lambda: client.get(url))
+
+
+def test_search(bench, client, dataset):
+    word = dataset['post'].text.split()[0]
+    url = reverse('posts:search') + f'?q={word}'
+    assert client.get(url).context['page_obj'].object_list
+    bench('search', lambda: client.get(url))
+
+
+def test_groups(bench, client, dataset):
+    url = reverse('posts:groups')
+    bench('groups', lambda: client.get(url), warm=False)
+
+
+def test_add_comment(bench, user_client, dataset):
+    url = reverse('posts:add_comment', args=[dataset['post'].pk])
+    bench('add_comment',
+          lambda: user_client.post(url, {'text': 'Нагрузочный комментарий'}))
+
+
+@pytest.mark.parametrize('name', FEEDS)
+def test_api_feed(bench, client, dataset, name):
+    url = feed_url(name, dataset, namespace='api')
+    bench(f'api:{name}', lambda: client.get(url), warm=False)
+
+
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+AUTH_BACKENDS = {
+    'model': 'django.contrib.auth.backends.ModelBackend',
+    'cached': 'users.backends.CachedModelBackend',
+}
+
+
+@pytest.mark.parametrize('backend', AUTH_BACKENDS)
+@pytest.mark.parametrize('engine', SESSION_ENGINES)
+def test_session_layer(bench, client, settings, dataset, engine, backend):
+    settings.SESSION_ENGINE = SESSION_ENGINES[engine]
+    settings.AUTHENTICATION_BACKENDS = [AUTH_BACKENDS[backend]]
+    client.force_login(dataset['reader'])
+    url = reverse('posts:follow_index')
+    bench(f'session[{engine},{backend}]', lambda: client.get(url))
+
+
+SYNDICATION = {
+    'index': 'index_feed',
+    'group_posts': 'group_feed',
+    'profile': 'profile_feed',
+}
+
+
+def read_feed(client, url):
+    response = client.get(url)
+    b''.join(response.streaming_content if response.streaming else [])
+    return response
+
+
+@pytest.mark.parametrize('warm', [False, True], ids=['cold', 'warm'])
+@pytest.mark.parametrize('name', FEEDS)
+def test_syndication_feed(bench, client, dataset, name, warm):
+    url = reverse(f'posts:{SYNDICATION[name]}',
+                  kwargs=resolve(feed_url(name, dataset)).kwargs)
+    label = f'rss:{name}[{"warm" if warm else "cold"}]'
+    bench(label, lambda: read_feed(client, url), warm=warm)
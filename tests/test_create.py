@@ -3,6 +3,7 @@ from io import BytesIO
 import pytest
 from django import forms
 from django.core.files.base import File
+from django.test import override_settings
 from PIL import Image
 
 from posts.models import Post
@@ -59,6 +60,8 @@ class TestCreateView:
         file_obj.seek(0)
         return File(file_obj, name=name)
 
+    # Миниатюры режутся сразу, а не в пуле, который пережил бы mock_media.
+    @override_settings(THUMBNAIL_WORKERS=0)
     @pytest.mark.django_db(transaction=True)
     def test_create_view_post(self, mock_media, user_client, user, group):
         text = 'Проверка нового поста!'
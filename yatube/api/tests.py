@@ -0,0 +1,99 @@
+import gzip
+import json
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+from posts.utils import PAGE_FOR_LIST
+
+
+class ApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='gol43')
+        cls.reader = User.objects.create_user(username='fol43')
+        cls.group = Group.objects.create(
+            title='Сады', slug='gardens', description='')
+        for i in range(PAGE_FOR_LIST + 3):
+            Post.objects.create(text=f'Пост {i}', author=cls.author,
+                                group=cls.group)
+        cls.post = Post.objects.latest('pk')
+        Comment.objects.create(post=cls.post, author=cls.reader, text='Ок')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        cache.clear()
+
+    def get_json(self, client, url, **params):
+        response = client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
+    def test_feeds_page_by_cursor(self):
+        """ленты отдаются страницами по курсору до самого конца"""
+        urls = {
+            reverse('api:index'): self.guest_client,
+            reverse('api:group_posts', args=[self.group.slug]):
+                self.guest_client,
+            reverse('api:profile', args=[self.author.username]):
+                self.guest_client,
+            reverse('api:follow_index'): self.reader_client,
+        }
+        expected = list(Post.objects.order_by(
+            '-pub_date', '-pk').values_list('pk', flat=True))
+        for url, client in urls.items():
+            with self.subTest(url=url):
+                data = self.get_json(client, url)
+                self.assertEqual(len(data['results']), PAGE_FOR_LIST)
+                rest = self.get_json(client, data['next'])
+                self.assertIsNone(rest['next'])
+                ids = [item['id'] for item in data['results']
+                       + rest['results']]
+                self.assertEqual(ids, expected)
+
+    def test_sparse_fields(self):
+        """?fields= сужает ответ и SELECT"""
+        url = reverse('api:index')
+        with self.assertNumQueries(2) as queries:
+            data = self.get_json(self.guest_client, url, fields='id,text')
+        self.assertEqual(set(data['results'][0]), {'id', 'text'})
+        self.assertNotIn('JOIN', queries.captured_queries[-1]['sql'])
+        response = self.guest_client.get(url, {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_post_detail_and_comments(self):
+        data = self.get_json(
+            self.guest_client,
+            reverse('api:post_detail', args=[self.post.pk]))
+        self.assertEqual(data['author'], self.author.username)
+        self.assertEqual(data['group'], self.group.slug)
+        self.assertIsNone(data['image'])
+        data = self.get_json(
+            self.guest_client,
+            reverse('api:post_comments', args=[self.post.pk]))
+        self.assertEqual([item['text'] for item in data['results']], ['Ок'])
+        response = self.guest_client.get(
+            reverse('api:post_detail', args=[0]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_follow_needs_login(self):
+        response = self.guest_client.get(reverse('api:follow_index'))
+        self.assertEqual(response.status_code, 401)
+
+    def test_gzip_and_conditional_get(self):
+        """ответ сжимается и повторно отдаётся как 304"""
+        url = reverse('api:index')
+        response = self.guest_client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        data = json.loads(gzip.decompress(response.content))
+        self.assertEqual(len(data['results']), PAGE_FOR_LIST)
+        response = self.guest_client.get(
+            url, HTTP_ACCEPT_ENCODING='gzip',
+            HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
@@ -0,0 +1,137 @@
+from django.core.files.storage import default_storage
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_safe
+
+from posts.conditional import (conditional_page, group_state, index_state,
+                               post_state, profile_state)
+from posts.models import Comment, Group, Post, User
+from posts.timeline import FollowFeed
+from posts.utils import PAGE_FOR_LIST, KeysetPaginator, attach_cursors
+
+MAX_LIMIT = 100
+
+# Поле ответа -> путь для .values(); JOIN появляется, только если
+# клиент запросил поле автора или группы.
+POST_FIELDS = {
+    'id': 'pk',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+}
+COMMENT_FIELDS = {
+    'id': 'pk',
+    'text': 'text',
+    'created': 'created',
+    'author': 'author__username',
+}
+
+
+def error(detail, status=400):
+    return JsonResponse({'detail': detail}, status=status)
+
+
+def selected_fields(request, fields):
+    """Поля из ?fields=a,b; без параметра — все."""
+    names = [name for name in request.GET.get('fields', '').split(',')
+             if name]
+    unknown = set(names) - fields.keys()
+    if unknown:
+        raise ValueError(
+            'Неизвестные поля: ' + ', '.join(sorted(unknown)))
+    return names or list(fields)
+
+
+def page_limit(request):
+    try:
+        limit = int(request.GET.get('limit', PAGE_FOR_LIST))
+    except ValueError:
+        raise ValueError('limit должен быть числом')
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def serialize(row, names, fields):
+    item = {name: row[fields[name]] for name in names}
+    if 'image' in item:
+        item['image'] = (default_storage.url(item['image'])
+                         if item['image'] else None)
+    return item
+
+
+def page_response(request, rows, fields, key='pub_date', descending=True):
+    """Страница строк из .values() после курсора ?after=."""
+    try:
+        names = selected_fields(request, fields)
+        limit = page_limit(request)
+    except ValueError as exc:
+        return error(str(exc))
+    lookups = {fields[name] for name in names} | {'pk', key}
+    paginator = KeysetPaginator(rows.values(*lookups), limit, key=key,
+                                descending=descending)
+    page = attach_cursors(paginator.page_after(request.GET.get('after', '')))
+    next_url = None
+    if page.has_next():
+        params = request.GET.copy()
+        params['after'] = page.next_cursor
+        next_url = request.build_absolute_uri('?' + params.urlencode())
+    return JsonResponse({
+        'results': [serialize(row, names, fields) for row in page],
+        'next': next_url})
+
+
+@require_safe
+@gzip_page
+@conditional_page(index_state)
+def index(request):
+    return page_response(request, Post.objects.all(), POST_FIELDS)
+
+
+@require_safe
+@gzip_page
+@conditional_page(group_state)
+def group_posts(request, slug):
+    group = get_object_or_404(Group.objects.only('pk'), slug=slug)
+    return page_response(
+        request, Post.objects.filter(group=group), POST_FIELDS)
+
+
+@require_safe
+@gzip_page
+@conditional_page(profile_state)
+def profile(request, username):
+    author = get_object_or_404(User.objects.only('pk'), username=username)
+    return page_response(
+        request, Post.objects.filter(author=author), POST_FIELDS)
+
+
+@require_safe
+@gzip_page
+@conditional_page(post_state)
+def post_detail(request, post_id):
+    try:
+        names = selected_fields(request, POST_FIELDS)
+    except ValueError as exc:
+        return error(str(exc))
+    lookups = {POST_FIELDS[name] for name in names}
+    row = get_object_or_404(Post.objects.values(*lookups), pk=post_id)
+    return JsonResponse(serialize(row, names, POST_FIELDS))
+
+
+@require_safe
+@gzip_page
+def post_comments(request, post_id):
+    get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    return page_response(
+        request, Comment.objects.filter(post_id=post_id), COMMENT_FIELDS,
+        key='created', descending=False)
+
+
+@require_safe
+@gzip_page
+def follow_index(request):
+    if not request.user.is_authenticated:
+        return error('Нужна авторизация', status=401)
+    return page_response(request, FollowFeed(request.user), POST_FIELDS)
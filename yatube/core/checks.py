@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+from users.backends import USER_CACHE
+
+LOCAL_CACHE_BACKENDS = ('LocMemCache', 'DummyCache')
+
+
+SESSION_CACHE_ENGINES = ('.cache', '.cached_db')
+
+CACHED_USER_BACKEND = 'users.backends.CachedModelBackend'
+
+
+def shared_cache_aliases():
+    """Кэши, которые все процессы должны видеть одинаково."""
+    aliases = {'default', getattr(settings, 'THUMBNAIL_CACHE', 'default')}
+    if settings.SESSION_ENGINE.endswith(SESSION_CACHE_ENGINES):
+        aliases.add(settings.SESSION_CACHE_ALIAS)
+    if CACHED_USER_BACKEND in settings.AUTHENTICATION_BACKENDS:
+        aliases.add(USER_CACHE)
+    return aliases
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_caches(app_configs, **kwargs):
+    """Версии лент или сессии в кэше процесса: другие воркеры их не увидят."""
+    warnings = []
+    for alias in sorted(shared_cache_aliases()):
+        backend = settings.CACHES.get(alias, {}).get('BACKEND', '')
+        if backend.endswith(LOCAL_CACHE_BACKENDS):
+            warnings.append(Warning(
+                f'Кэш {alias!r} живёт в памяти одного процесса.',
+                hint=('При нескольких воркерах задайте CACHE_BACKEND и '
+                      'CACHE_LOCATION: memcached, Redis или FileBasedCache.'),
+                id='core.W001'))
+    return warnings
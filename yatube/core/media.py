@@ -0,0 +1,133 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (FileResponse, Http404, HttpResponse,
+                         StreamingHttpResponse)
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
+
+MEDIA_CHUNK_SIZE = 64 * 1024
+MEDIA_MAX_AGE = 60 * 60 * 24
+MEDIA_IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def byte_range(header, size):
+    """(start, end) включительно из Range, None — отдать файл целиком.
+
+    Несколько диапазонов через запятую не поддерживаются: по RFC 7233
+    на них можно ответить целым файлом. ValueError — диапазон вне файла.
+    """
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if match is None:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # bytes=-N: последние N байт.
+        length = int(end)
+        if not length:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start > end or start >= size:
+        raise ValueError(header)
+    return start, end
+
+
+def _chunks(path, start, length):
+    with open(path, 'rb') as media:
+        media.seek(start)
+        while length > 0:
+            chunk = media.read(min(MEDIA_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _content_type(path):
+    return mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+def _handoff(mode, path, name):
+    """Пустой ответ, тело которого отдаст веб-сервер перед Django."""
+    response = HttpResponse(content_type=_content_type(path))
+    if mode == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = (
+            settings.MEDIA_ACCEL_PREFIX + quote(name))
+    else:
+        response['X-Sendfile'] = path
+    return response
+
+
+def _file_response(request, path, stat, etag):
+    content_type = _content_type(path)
+    size = stat.st_size
+    header = request.META.get('HTTP_RANGE', '')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    # If-Range с устаревшим ETag: у клиента другая версия, шлём всё.
+    if header and if_range not in (None, etag, http_date(stat.st_mtime)):
+        header = ''
+    try:
+        span = byte_range(header, size) if header else None
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    if span is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+        response['Content-Length'] = size
+    else:
+        start, end = span
+        response = StreamingHttpResponse(
+            _chunks(path, start, end - start + 1), status=206,
+            content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = end - start + 1
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    """Отдаёт файл из MEDIA_ROOT по настройке MEDIA_SERVE.
+
+    'x-accel-redirect' и 'x-sendfile' передают файл nginx или Apache:
+    воркер только проверяет путь. 'python' отдаёт сам, с Range; целый
+    файл идёт через wsgi.file_wrapper (sendfile, если сервер его
+    умеет), диапазон — кусками по MEDIA_CHUNK_SIZE. На If-None-Match
+    и If-Modified-Since в любом режиме отвечаем 304 сами.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat = os.stat(full_path)
+    except (SuspiciousFileOperation, FileNotFoundError, NotADirectoryError):
+        raise Http404('Нет такого файла')
+    if not os.path.isfile(full_path):
+        raise Http404('Нет такого файла')
+    etag = quote_etag(f'{stat.st_mtime_ns:x}-{stat.st_size:x}')
+    mode = getattr(settings, 'MEDIA_SERVE', 'python')
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        if mode in ('x-accel-redirect', 'x-sendfile'):
+            response = _handoff(mode, full_path, path)
+        else:
+            response = _file_response(request, full_path, stat, etag)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    # Имя с хешем содержимого (см. posts.images) не переиспользуется.
+    pattern = getattr(settings, 'MEDIA_IMMUTABLE', None)
+    response['Cache-Control'] = (
+        MEDIA_IMMUTABLE_CACHE if pattern and re.match(pattern, path)
+        else f'public, max-age={MEDIA_MAX_AGE}')
+    return response
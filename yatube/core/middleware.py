@@ -0,0 +1,258 @@
+import heapq
+import json
+import logging
+import mimetypes
+import os
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import FileResponse, HttpResponseNotModified
+from django.template.backends.django import Template
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from .routers import route_reads_to_replicas, wrote_to_primary
+
+logger = logging.getLogger('yatube.slow_requests')
+_local = threading.local()
+
+# Имя с хешем содержимого не меняет смысла: кэшируем на год.
+STATIC_IMMUTABLE = 'public, max-age=31536000, immutable'
+STATIC_UNHASHED_MAX_AGE = 60 * 60
+
+
+class RequestTimer:
+    """Счётчики одного запроса: SQL через execute_wrapper, шаблоны, итог."""
+
+    def __init__(self, keep):
+        self.keep = keep
+        self.queries = 0
+        self.db = 0.0
+        self.templates = 0.0
+        self.render_depth = 0
+        self.slowest = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.db += elapsed
+            item = (elapsed, self.queries, sql)
+            if len(self.slowest) < self.keep:
+                heapq.heappush(self.slowest, item)
+            else:
+                heapq.heappushpop(self.slowest, item)
+
+    def top_queries(self):
+        return [
+            {'ms': round(elapsed * 1000, 2), 'sql': sql}
+            for elapsed, _, sql in sorted(self.slowest, reverse=True)]
+
+
+def _timed(render):
+    def wrapper(self, context=None, request=None):
+        timer = getattr(_local, 'timer', None)
+        if timer is None:
+            return render(self, context, request)
+        # Вложенный render_to_string уже учтён во внешнем шаблоне.
+        timer.render_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, context, request)
+        finally:
+            timer.render_depth -= 1
+            if not timer.render_depth:
+                timer.templates += time.perf_counter() - started
+
+    wrapper.timed = True
+    return wrapper
+
+
+if not getattr(Template.render, 'timed', False):
+    Template.render = _timed(Template.render)
+
+
+class RequestTimingMiddleware:
+    """Время запроса по частям: заголовок Server-Timing и журнал медленных.
+
+    Server-Timing получают все при SERVER_TIMING, иначе только
+    сотрудники (is_staff). Запрос считается медленным, если превышен
+    SLOW_REQUEST_MS или SLOW_REQUEST_QUERIES; тогда в журнал
+    yatube.slow_requests уходит JSON с представлением, таймингами и
+    самыми долгими запросами к БД.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.public = getattr(settings, 'SERVER_TIMING', settings.DEBUG)
+        self.slow_ms = getattr(settings, 'SLOW_REQUEST_MS', 500)
+        self.slow_queries = getattr(settings, 'SLOW_REQUEST_QUERIES', 50)
+        self.keep = getattr(settings, 'SLOW_REQUEST_TOP_QUERIES', 5)
+
+    def __call__(self, request):
+        timer = RequestTimer(self.keep)
+        _local.timer = timer
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timer))
+                response = self.get_response(request)
+        finally:
+            _local.timer = None
+        total = time.perf_counter() - started
+        match = request.resolver_match
+        view = match.view_name if match else None
+        if self.show_timing(request):
+            response['Server-Timing'] = ', '.join((
+                f'db;dur={timer.db * 1000:.1f};'
+                f'desc="{timer.queries} queries"',
+                f'tpl;dur={timer.templates * 1000:.1f}',
+                f'total;dur={total * 1000:.1f};desc="{view}"',
+            ))
+        if total * 1000 >= self.slow_ms or timer.queries >= self.slow_queries:
+            logger.warning(json.dumps({
+                'view': view,
+                'path': request.path,
+                'method': request.method,
+                'status': response.status_code,
+                'total_ms': round(total * 1000, 1),
+                'db_ms': round(timer.db * 1000, 1),
+                'template_ms': round(timer.templates * 1000, 1),
+                'queries': timer.queries,
+                'top_queries': timer.top_queries(),
+            }, ensure_ascii=False))
+        return response
+
+    def show_timing(self, request):
+        if self.public:
+            return True
+        # Статику отдают раньше AuthenticationMiddleware: там user нет.
+        user = getattr(request, 'user', None)
+        return user is not None and user.is_staff
+
+
+class ReplicaRoutingMiddleware:
+    """Отправляет чтения ленточных представлений на реплики.
+
+    Пользователь, который только что что-то записал, получает куку
+    REPLICA_PIN_COOKIE и REPLICA_PIN_SECONDS секунд читает с основной
+    базы: так он сразу видит свой пост, комментарий или подписку.
+    Недавно изменённые ленты тоже читаются с основной базы
+    (posts.caching.feed_versions).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.views = set(getattr(settings, 'REPLICA_VIEWS', ()))
+        self.cookie = getattr(settings, 'REPLICA_PIN_COOKIE', 'db_pin')
+        self.seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+
+    def __call__(self, request):
+        route_reads_to_replicas(False)
+        try:
+            response = self.get_response(request)
+            if wrote_to_primary():
+                response.set_cookie(self.cookie, '1', max_age=self.seconds,
+                                    httponly=True)
+        finally:
+            route_reads_to_replicas(False)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        route_reads_to_replicas(
+            request.method in ('GET', 'HEAD')
+            and request.resolver_match.view_name in self.views
+            and self.cookie not in request.COOKIES)
+
+
+def accepted_encodings(request):
+    """Кодировки из Accept-Encoding, кроме явно запрещённых q=0."""
+    accepted = set()
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params = part.strip().partition(';')
+        if coding and params.replace(' ', '') not in ('q=0', 'q=0.0'):
+            accepted.add(coding.lower())
+    return accepted
+
+
+class StaticFilesMiddleware:
+    """Отдаёт собранную статику из STATIC_ROOT, не доходя до представлений.
+
+    Для деплоя без CDN и отдельного веб-сервера (STATIC_SERVE). Имена
+    с хешем из манифеста помечаются immutable, остальные кэшируются на
+    STATIC_UNHASHED_MAX_AGE. Готовые .br/.gz копии отдаются клиентам,
+    которые их принимают. Список файлов читается один раз: после
+    collectstatic процесс перезапускают.
+    """
+
+    def __init__(self, get_response):
+        if not (getattr(settings, 'STATIC_SERVE', False)
+                and settings.STATIC_ROOT):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = settings.STATIC_URL
+        self.root = settings.STATIC_ROOT
+        self._files = None
+        self._hashed = None
+
+    def __call__(self, request):
+        if (request.method in ('GET', 'HEAD')
+                and request.path_info.startswith(self.prefix)):
+            response = self.serve(request,
+                                  request.path_info[len(self.prefix):])
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    def files(self):
+        if self._files is None:
+            files = {}
+            for directory, _, filenames in os.walk(self.root):
+                for filename in filenames:
+                    path = os.path.join(directory, filename)
+                    name = os.path.relpath(path, self.root)
+                    files[name.replace(os.sep, '/')] = path
+            self._hashed = set(
+                getattr(staticfiles_storage, 'hashed_files', {}).values())
+            self._files = files
+        return self._files
+
+    def serve(self, request, name):
+        # Путь ищется только среди собранных файлов: «..» не пройдёт.
+        files = self.files()
+        path = files.get(name)
+        if path is None:
+            return None
+        encoding = None
+        accepted = accepted_encodings(request)
+        for suffix, coding in (('.br', 'br'), ('.gz', 'gzip')):
+            if coding in accepted and name + suffix in files:
+                path, encoding = files[name + suffix], coding
+                break
+        stat = os.stat(path)
+        if was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'),
+                              stat.st_mtime, stat.st_size):
+            content_type = (mimetypes.guess_type(name)[0]
+                            or 'application/octet-stream')
+            response = FileResponse(open(path, 'rb'),
+                                    content_type=content_type)
+            response['Content-Length'] = stat.st_size
+            if encoding:
+                response['Content-Encoding'] = encoding
+        else:
+            response = HttpResponseNotModified()
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        response['Vary'] = 'Accept-Encoding'
+        response['Cache-Control'] = (
+            STATIC_IMMUTABLE if name in self._hashed
+            else f'public, max-age={STATIC_UNHASHED_MAX_AGE}')
+        return response
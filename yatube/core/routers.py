@@ -0,0 +1,52 @@
+import random
+import threading
+
+from django.conf import settings
+
+_state = threading.local()
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias != 'default']
+
+
+def route_reads_to_replicas(enabled):
+    """Включает чтение с реплик в текущем потоке (делает middleware)."""
+    _state.replicas = enabled
+    _state.wrote = False
+
+
+def read_from_primary():
+    """Остальные чтения запроса идут в default, как после записи."""
+    _state.replicas = False
+
+
+def wrote_to_primary():
+    return getattr(_state, 'wrote', False)
+
+
+class PrimaryReplicaRouter:
+    """Пишет всегда в default, читает с реплик только там, где разрешено.
+
+    Чтение с реплик включает ReplicaRoutingMiddleware для представлений
+    из REPLICA_VIEWS. После первой записи в запросе все чтения до конца
+    запроса идут в default, чтобы не прочитать собственную запись
+    со старой реплики.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = replica_aliases()
+        if (replicas and getattr(_state, 'replicas', False)
+                and not wrote_to_primary()):
+            return random.choice(replicas)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
@@ -0,0 +1,63 @@
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - без brotli только .gz
+    brotli = None
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.ico', '.json', '.txt', '.xml',
+                '.map', '.html')
+# Маленьким файлам сжатие не окупает лишний заголовок.
+MIN_COMPRESS_SIZE = 256
+
+
+def compressed_variants(data):
+    """(расширение, байты) сжатых вариантов, которые вышли заметно меньше."""
+    variants = []
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(data, quality=11)))
+    # mtime=0: одинаковый файл сжимается в одинаковые байты.
+    variants.append(('.gz', gzip.compress(data, 9, mtime=0)))
+    return [(suffix, packed) for suffix, packed in variants
+            if len(packed) < len(data) * 0.95]
+
+
+class CompressedManifestStorage(ManifestStaticFilesStorage):
+    """Статика с хешем содержимого в имени и сжатыми копиями рядом.
+
+    collectstatic пишет style.<hash>.css, а для текстовых файлов ещё
+    style.<hash>.css.gz и, если установлен brotli, .br — их отдаёт
+    core.middleware.StaticFilesMiddleware без сжатия на лету.
+    """
+
+    manifest_strict = False
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in set(self.hashed_files.values()):
+            if name.endswith(COMPRESSIBLE):
+                self.compress(name)
+
+    def compress(self, name):
+        with self.open(name) as source:
+            data = source.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return
+        for suffix, packed in compressed_variants(data):
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            self._save(name + suffix, ContentFile(packed))
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # Файла нет в собранной статике: лучше ссылка без хеша (и
+            # 404 на неё), чем 500 на всей странице. Промах запоминаем.
+            self.hashed_files[self.hash_key(self.clean_name(name))] = name
+            return name
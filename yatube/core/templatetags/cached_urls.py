@@ -0,0 +1,29 @@
+from functools import lru_cache
+
+from django import template
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.urls import get_script_prefix, get_urlconf, reverse
+
+register = template.Library()
+
+
+@lru_cache(maxsize=None)
+def _reverse(name, prefix, urlconf):
+    return reverse(name, urlconf=urlconf)
+
+
+@receiver(setting_changed)
+def _clear(setting, **kwargs):
+    if setting == 'ROOT_URLCONF':
+        _reverse.cache_clear()
+
+
+@register.simple_tag
+def cached_url(name):
+    """{% url %} для маршрутов без аргументов: reverse один раз на процесс.
+
+    Ключ кэша — имя, префикс скрипта и urlconf запроса, поэтому
+    за другим префиксом или urlconf адрес считается заново.
+    """
+    return _reverse(name, get_script_prefix(), get_urlconf())
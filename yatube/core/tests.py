@@ -0,0 +1,345 @@
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+from unittest import mock, skipIf
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.template import Context, Template
+from django.test import (Client, RequestFactory, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from django.urls import resolve, reverse, set_script_prefix
+
+from posts.caching import INDEX_FEED, bump_feeds, feed_versions
+from posts.models import Post
+
+from .checks import check_shared_caches
+from .storage import brotli
+from .middleware import ReplicaRoutingMiddleware
+from .routers import PrimaryReplicaRouter, route_reads_to_replicas
+
+User = get_user_model()
+
+
+class RequestTimingMiddlewareTest(TestCase):
+    def setUp(self):
+        self.guest_client = Client()
+
+    def test_server_timing_header(self):
+        """в ответе есть Server-Timing с БД, шаблонами и представлением"""
+        response = self.guest_client.get(reverse('posts:index'))
+        header = response['Server-Timing']
+        self.assertIn('db;dur=', header)
+        self.assertIn('tpl;dur=', header)
+        self.assertIn('desc="posts:index"', header)
+
+    @override_settings(SERVER_TIMING=False, SLOW_REQUEST_QUERIES=1)
+    def test_server_timing_only_for_staff(self):
+        """без SERVER_TIMING заголовок видят сотрудники, журнал пишется"""
+        staff = User.objects.create_user(username='admin', is_staff=True)
+        with self.assertLogs('yatube.slow_requests', 'WARNING'):
+            response = Client().get(reverse('posts:index'))
+        self.assertNotIn('Server-Timing', response)
+        staff_client = Client()
+        staff_client.force_login(staff)
+        response = staff_client.get(reverse('posts:index'))
+        self.assertIn('Server-Timing', response)
+
+    @override_settings(SLOW_REQUEST_QUERIES=1)
+    def test_slow_request_is_logged(self):
+        """превышение порога пишет JSON с самыми долгими запросами"""
+        User.objects.create_user(username='gol43')
+        with self.assertLogs('yatube.slow_requests', 'WARNING') as logs:
+            self.guest_client.get(reverse('posts:profile', args=['gol43']))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'posts:profile')
+        self.assertGreaterEqual(record['queries'], 1)
+        self.assertTrue(record['top_queries'][0]['sql'])
+
+
+@mock.patch('core.routers.replica_aliases', return_value=['replica0'])
+class ReplicaRoutingTest(TestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.middleware = ReplicaRoutingMiddleware(None)
+
+    def tearDown(self):
+        route_reads_to_replicas(False)
+
+    def route(self, request):
+        request.resolver_match = resolve(request.path)
+        self.middleware.process_view(request, None, (), {})
+        return self.router.db_for_read(Post)
+
+    def test_feed_reads_go_to_replica(self, aliases):
+        """чтение ленты уходит на реплику, запись — в основную базу"""
+        request = RequestFactory().get(reverse('posts:index'))
+        self.assertEqual(self.route(request), 'replica0')
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_writes_and_pinned_users_read_primary(self, aliases):
+        """POST, не-ленточные страницы и кука после записи — в default"""
+        factory = RequestFactory()
+        requests = [
+            factory.post(reverse('posts:index')),
+            factory.get(reverse('posts:post_create')),
+            factory.get(reverse('posts:index'), HTTP_COOKIE='db_pin=1'),
+        ]
+        for request in requests:
+            with self.subTest(request=request):
+                self.assertEqual(self.route(request), 'default')
+
+    def test_fresh_feed_version_reads_primary(self, aliases):
+        """сразу после сдвига версии ленту собирают с основной базы"""
+        request = RequestFactory().get(reverse('posts:index'))
+        bump_feeds(INDEX_FEED)
+        self.assertEqual(self.route(request), 'replica0')
+        feed_versions(INDEX_FEED)
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+        with self.settings(REPLICA_PIN_SECONDS=0):
+            self.route(request)
+            feed_versions(INDEX_FEED)
+            self.assertEqual(self.router.db_for_read(Post), 'replica0')
+
+    def test_write_sets_pin_cookie(self, aliases):
+        """после записи пользователь читает из основной базы"""
+        user = User.objects.create_user(username='gol43')
+        post = Post.objects.create(text='Текст', author=user)
+        client = Client()
+        client.force_login(user)
+        response = client.post(
+            reverse('posts:add_comment', args=[post.pk]), {'text': 'Ок'})
+        self.assertIn('db_pin', response.cookies)
+        response = Client().get(reverse('about:author'))
+        self.assertNotIn('db_pin', response.cookies)
+
+
+class SqliteReplicaTest(TransactionTestCase):
+    """Реплика — отдельный файл SQLite, как при DB_REPLICAS=путь."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        user = User.objects.create_user(username='gol43')
+        Post.objects.create(text='Уже на реплике', author=user)
+        name = os.path.join(directory, 'replica.sqlite3')
+        connection.ensure_connection()
+        replica = sqlite3.connect(name)
+        connection.connection.backup(replica)
+        replica.close()
+        Post.objects.create(text='Ещё не на реплике', author=user)
+        patcher = mock.patch.dict(settings.DATABASES, {'replica0': {
+            **connection.settings_dict, 'NAME': name}})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.drop_replica_connection)
+
+    @staticmethod
+    def drop_replica_connection():
+        if hasattr(connections._connections, 'replica0'):
+            connections['replica0'].close()
+            del connections._connections.replica0
+
+    def feed_texts(self, client):
+        # Страница должна строиться в запросе, а не браться из кэша.
+        cache.clear()
+        response = client.get(reverse('posts:index'))
+        return [post.text for post in response.context['page_obj']]
+
+    @override_settings(REPLICA_PIN_SECONDS=0)
+    def test_feed_reads_second_sqlite_file(self):
+        """лента читается из файла реплики, после записи — из основной"""
+        self.assertEqual(self.feed_texts(Client()), ['Уже на реплике'])
+        pinned = Client()
+        pinned.cookies['db_pin'] = '1'
+        self.assertEqual(self.feed_texts(pinned),
+                         ['Ещё не на реплике', 'Уже на реплике'])
+
+
+class SharedCacheCheckTest(SimpleTestCase):
+    def test_process_local_caches_are_reported(self):
+        """check --deploy предупреждает о кэшах в памяти процесса"""
+        warnings = check_shared_caches(None)
+        self.assertEqual({warning.id for warning in warnings}, {'core.W001'})
+        shared = {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': tempfile.gettempdir(),
+        }
+        with self.settings(CACHES={'default': shared, 'thumbnails': shared}):
+            self.assertEqual(check_shared_caches(None), [])
+        with self.settings(SESSION_ENGINE=(
+                'django.contrib.sessions.backends.cached_db')):
+            self.assertIn("'sessions'", ' '.join(
+                warning.msg for warning in check_shared_caches(None)))
+        with self.settings(AUTHENTICATION_BACKENDS=[
+                'users.backends.CachedModelBackend']):
+            self.assertIn("'users'", ' '.join(
+                warning.msg for warning in check_shared_caches(None)))
+
+
+class CachedUrlTagTest(SimpleTestCase):
+    def test_matches_url_tag_and_respects_prefix(self):
+        """{% cached_url %} даёт тот же адрес, что {% url %}"""
+        source = ("{% load cached_urls %}{% cached_url 'posts:index' %}|"
+                  "{% url 'posts:index' %}")
+        cached, plain = Template(source).render(Context()).split('|')
+        self.assertEqual(cached, plain)
+        set_script_prefix('/yatube/')
+        try:
+            self.assertEqual(Template(source).render(Context()),
+                             '/yatube/|/yatube/')
+        finally:
+            set_script_prefix('/')
+
+
+class StaticPipelineTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.source = tempfile.mkdtemp()
+        cls.root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(cls.source, 'css'))
+        os.makedirs(os.path.join(cls.source, 'img'))
+        with open(os.path.join(cls.source, 'css', 'site.css'), 'w') as css:
+            css.write('body { background: url("../img/logo.png"); }\n'
+                      + '.card { margin: 0 auto; }\n' * 50)
+        with open(os.path.join(cls.source, 'img', 'logo.png'), 'wb') as png:
+            png.write(b'\x89PNG\r\n\x1a\n' + b'\x00' * 64)
+        cls.settings_override = override_settings(
+            STATICFILES_DIRS=[cls.source], STATIC_ROOT=cls.root,
+            STATIC_SERVE=True)
+        cls.settings_override.enable()
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        shutil.rmtree(cls.source, ignore_errors=True)
+        shutil.rmtree(cls.root, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_collectstatic_hashes_and_compresses(self):
+        """имена с хешем, ссылки в CSS переписаны, рядом лежит .gz"""
+        css = staticfiles_storage.stored_name('css/site.css')
+        logo = staticfiles_storage.stored_name('img/logo.png')
+        self.assertRegex(css, r'^css/site\.[0-9a-f]{12}\.css$')
+        with staticfiles_storage.open(css) as stored:
+            content = stored.read()
+        self.assertIn(os.path.basename(logo).encode(), content)
+        with staticfiles_storage.open(css + '.gz') as packed:
+            self.assertEqual(gzip.decompress(packed.read()), content)
+        self.assertFalse(staticfiles_storage.exists(logo + '.gz'))
+        self.assertEqual(
+            Template("{% load static %}{% static 'css/site.css' %}").render(
+                Context()), '/static/' + css)
+
+    def test_middleware_serves_precompressed_immutable_files(self):
+        css = staticfiles_storage.stored_name('css/site.css')
+        client = Client()
+        response = client.get('/static/' + css, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        modified = response['Last-Modified']
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        response = client.get('/static/css/site.css',
+                              HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertNotIn('immutable', response['Cache-Control'])
+        response = client.get('/static/' + css,
+                              HTTP_ACCEPT_ENCODING='gzip',
+                              HTTP_IF_MODIFIED_SINCE=modified)
+        self.assertEqual(response.status_code, 304)
+        response = client.get('/static/../settings.py')
+        self.assertEqual(response.status_code, 404)
+
+    @skipIf(brotli is None, 'brotli не установлен')
+    def test_brotli_copy_is_preferred(self):
+        """с brotli рядом лежит .br, и клиенту с br отдают его"""
+        css = staticfiles_storage.stored_name('css/site.css')
+        with staticfiles_storage.open(css) as stored:
+            content = stored.read()
+        with staticfiles_storage.open(css + '.br') as packed:
+            self.assertEqual(brotli.decompress(packed.read()), content)
+        response = Client().get('/static/' + css,
+                                HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+
+
+class MediaServingTest(SimpleTestCase):
+    name = 'posts/ab/' + 'ab' * 32 + '.txt'
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        for name in (self.name, 'plain.txt'):
+            path = os.path.join(self.root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as media:
+                media.write(b'0123456789')
+        settings_override = override_settings(MEDIA_ROOT=self.root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_full_file_and_not_modified(self):
+        response = self.client.get('/media/plain.txt')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertNotIn('immutable', response['Cache-Control'])
+        response = self.client.get('/media/plain.txt',
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_byte_ranges(self):
+        """206 на диапазон и суффикс, 416 вне файла, If-Range по ETag"""
+        response = self.client.get('/media/plain.txt', HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        etag = response['ETag']
+        response = self.client.get('/media/plain.txt', HTTP_RANGE='bytes=-3')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+        response = self.client.get('/media/plain.txt', HTTP_RANGE='bytes=20-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+        response = self.client.get('/media/plain.txt', HTTP_RANGE='bytes=2-5',
+                                   HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+        response = self.client.get('/media/plain.txt', HTTP_RANGE='bytes=2-5',
+                                   HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_hashed_names_are_immutable(self):
+        response = self.client.get('/media/' + self.name)
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_web_server_handoff(self):
+        with self.settings(MEDIA_SERVE='x-accel-redirect'):
+            response = self.client.get('/media/' + self.name)
+        self.assertEqual(response['X-Accel-Redirect'],
+                         '/protected-media/' + self.name)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['Content-Type'], 'text/plain')
+        with self.settings(MEDIA_SERVE='x-sendfile'):
+            response = self.client.get('/media/plain.txt')
+        self.assertEqual(response['X-Sendfile'],
+                         os.path.join(self.root, 'plain.txt'))
+
+    def test_missing_and_outside_files(self):
+        for path in ('missing.txt', '../settings.py', 'posts'):
+            with self.subTest(path=path):
+                response = self.client.get('/media/' + path)
+                self.assertEqual(response.status_code, 404)
+        response = self.client.post('/media/plain.txt')
+        self.assertEqual(response.status_code, 405)
@@ -0,0 +1,69 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.routers import read_from_primary
+
+FEED_CACHE_TIMEOUT = 60 * 5
+INDEX_FEED = 'index'
+GROUPS_FEED = 'groups'
+
+
+def group_feed(group_id):
+    return f'group:{group_id}'
+
+
+def profile_feed(author_id):
+    return f'profile:{author_id}'
+
+
+def post_feed(post_id):
+    return f'post:{post_id}'
+
+
+def _version_key(feed):
+    return f'feed-version:{feed}'
+
+
+def _fresh_version():
+    # После вытеснения из кэша версия не начинается заново с единицы,
+    # поэтому старые страницы с тем же номером версии не всплывут.
+    return time.time_ns()
+
+
+def _avoid_lagging_replicas(versions):
+    # Реплика может ещё не видеть правку, которая сдвинула версию:
+    # собранная с неё страница легла бы в кэш и в ETag под новой
+    # версией и держалась бы до следующей правки.
+    lag = getattr(settings, 'REPLICA_PIN_SECONDS', 10) * 10 ** 9
+    if versions and time.time_ns() - max(versions) < lag:
+        read_from_primary()
+
+
+def feed_versions(*feeds):
+    keys = [_version_key(feed) for feed in feeds]
+    versions = cache.get_many(keys)
+    missing = {key: _fresh_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    versions = [versions[key] for key in keys]
+    _avoid_lagging_replicas(versions)
+    return versions
+
+
+def bump_feeds(*feeds):
+    """Сдвигает версии лент: их закэшированные страницы больше не читаются.
+
+    Версия — время изменения, по ней же считается Last-Modified.
+    """
+    if feeds:
+        cache.set_many(
+            {_version_key(feed): _fresh_version() for feed in feeds}, None)
+
+
+def feed_cache_key(request, *feeds):
+    """Ключ фрагмента ленты: версии лент плюс параметры страницы."""
+    versions = feed_versions(*feeds)
+    return ':'.join([*feeds, *map(str, versions), request.GET.urlencode()])
@@ -0,0 +1,116 @@
+import hashlib
+from calendar import timegm
+from functools import wraps
+
+from django.db.models import Max, OuterRef, Subquery
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .caching import (INDEX_FEED, feed_versions, group_feed, post_feed,
+                      profile_feed)
+from .models import Follow, Group, Post, User
+
+
+def _newest_post(**filters):
+    # Подзапрос с LIMIT 1 идёт по индексу (…, -pub_date), без агрегата.
+    return Subquery(Post.objects.filter(**filters).order_by(
+        '-pub_date', '-pk').values('pub_date')[:1])
+
+
+def index_state(request):
+    newest = Post.objects.order_by('-pub_date', '-pk').values_list(
+        'pub_date', flat=True).first()
+    return [INDEX_FEED], newest, ()
+
+
+def group_state(request, slug):
+    row = Group.objects.filter(slug=slug).annotate(
+        newest=_newest_post(group=OuterRef('pk'))).values_list(
+        'pk', 'newest').first()
+    if row is None:
+        return None
+    group_id, newest = row
+    return [group_feed(group_id)], newest, ()
+
+
+def profile_state(request, username):
+    row = User.objects.filter(username=username).annotate(
+        newest=_newest_post(author=OuterRef('pk'))).values_list(
+        'pk', 'newest').first()
+    if row is None:
+        return None
+    author_id, newest = row
+    # Кнопка «Подписаться/Отписаться» зависит от зрителя.
+    following = request.user.is_authenticated and Follow.objects.filter(
+        user=request.user, author_id=author_id).exists()
+    return [profile_feed(author_id)], newest, (following,)
+
+
+def post_state(request, post_id):
+    row = Post.objects.filter(pk=post_id).annotate(
+        newest=Max('comments__created')).values_list(
+        'author_id', 'group_id', 'pub_date', 'newest').first()
+    if row is None:
+        return None
+    author_id, group_id, pub_date, newest_comment = row
+    newest = max(filter(None, (pub_date, newest_comment)))
+    # Счётчик постов автора на странице меняется вместе с его профилем,
+    # название и ссылка группы — вместе с лентой группы.
+    feeds = [post_feed(post_id), profile_feed(author_id)]
+    if group_id is not None:
+        feeds.append(group_feed(group_id))
+    extra = ()
+    if request.user.is_authenticated:
+        # В форме комментария токен CSRF, а login() меняет его секрет:
+        # страница из кэша браузера со старым токеном не отправится.
+        get_token(request)
+        extra = (request.META.get('CSRF_COOKIE', ''),)
+    return feeds, newest, extra
+
+
+def page_validators(request, state):
+    """ETag и Last-Modified (в секундах) для состояния страницы."""
+    feeds, newest, extra = state
+    versions = feed_versions(*feeds)
+    parts = [*feeds, *versions, newest.isoformat() if newest else '',
+             request.user.pk or '', *extra]
+    etag = hashlib.md5(
+        ':'.join(map(str, parts)).encode()).hexdigest()
+    # Версия ленты — время её последнего изменения в наносекундах,
+    # так что правки без новых постов тоже сдвигают Last-Modified.
+    modified = max(versions) // 10 ** 9
+    if newest is not None:
+        modified = max(modified, timegm(newest.utctimetuple()))
+    return quote_etag(etag), modified
+
+
+def conditional_page(state_func):
+    """Отвечает 304 на If-None-Match/If-Modified-Since, не строя страницу.
+
+    state_func(request, *args, **kwargs) дешёво возвращает
+    (ленты, время новейшей записи, зависящие от зрителя значения)
+    или None, если страницы нет — тогда решает сама вьюха.
+    """
+    def decorator(view):
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            state = state_func(request, *args, **kwargs)
+            if state is None:
+                return view(request, *args, **kwargs)
+            etag, modified = page_validators(request, state)
+            response = get_conditional_response(
+                request, etag=etag, last_modified=modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                response.setdefault('ETag', etag)
+                response.setdefault('Last-Modified', http_date(modified))
+            # Без этого браузер сам решит, сколько страница свежа,
+            # и не придёт её проверять.
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return inner
+    return decorator
@@ -0,0 +1,148 @@
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+
+from .models import AuthorStats, Follow, FollowSuggestion, User
+from .stats import bump_many
+from .timeline import CELEBRITY_FOLLOWERS, backfill_many
+from .utils import bulk_create_in_chunks
+
+SUGGESTIONS_PER_USER = 10
+FOLLOW_LIST_LIMIT = 500
+# Сколько подписчиков автора и подписок читателя брать в расчёт:
+# у «звёзд» их слишком много, а на оценку они почти не влияют.
+SUGGESTION_SAMPLE = 1000
+SUGGESTION_BATCH_SIZE = 200
+# Не больше стольких id в одном IN: старые SQLite ограничены 999.
+ID_CHUNK = 500
+
+
+def follow(user, author_id):
+    """Подписывает одним INSERT; True, если подписка появилась."""
+    if user.pk == author_id:
+        return False
+    try:
+        with transaction.atomic():
+            Follow.objects.create(user=user, author_id=author_id)
+    except IntegrityError:
+        return False
+    return True
+
+
+def unfollow(user, author_id):
+    """Отписывает одним DELETE; True, если подписка была."""
+    deleted, _ = Follow.objects.filter(
+        user=user, author_id=author_id).delete()
+    return bool(deleted)
+
+
+@transaction.atomic
+def follow_many(user, usernames):
+    """Подписывает на список авторов; возвращает число новых подписок.
+
+    Незнакомые имена и сам пользователь пропускаются. Сигналы
+    bulk_create не вызывает, поэтому счётчики и ленты обновляются
+    здесь пачкой, а не по строке.
+    """
+    authors = set(User.objects.filter(username__in=set(usernames)).exclude(
+        pk=user.pk).values_list('pk', flat=True))
+    authors -= set(Follow.objects.filter(
+        user=user, author_id__in=authors).values_list('author_id', flat=True))
+    if not authors:
+        return 0
+    Follow.objects.bulk_create(
+        (Follow(user=user, author_id=author_id) for author_id in authors),
+        ignore_conflicts=True)
+    bump_many([user.pk], 'following_count', len(authors))
+    bump_many(authors, 'followers_count', 1)
+    backfill_many((user.pk, author_id) for author_id in authors)
+    return len(authors)
+
+
+def suggestions_for(user, limit=SUGGESTIONS_PER_USER):
+    """Готовые подсказки без тех, на кого уже подписан."""
+    return (FollowSuggestion.objects.filter(user=user)
+            .exclude(author__following__user=user)
+            .select_related('author').only('author', 'author__username')
+            .order_by('-score')[:limit])
+
+
+def _follow_pairs(field, ids, other):
+    """Пары (field, other) подписок для ids, запросами по ID_CHUNK id."""
+    ids = sorted(ids)
+    for start in range(0, len(ids), ID_CHUNK):
+        yield from Follow.objects.filter(
+            **{f'{field}__in': ids[start:start + ID_CHUNK]},
+        ).values_list(field, other).iterator()
+
+
+def _grouped(rows):
+    grouped = {}
+    for key, value in rows:
+        values = grouped.setdefault(key, [])
+        if len(values) < SUGGESTION_SAMPLE:
+            values.append(value)
+    return grouped
+
+
+def score_suggestions(user_ids):
+    """{user_id: Counter(author_id -> вес)} по графу совместных подписок.
+
+    Вес кандидата B для читателя U — сколько раз B встречается в
+    подписках тех, кто читает тех же авторов, что и U. Авторы с
+    больше чем CELEBRITY_FOLLOWERS подписчиками опорой не служат:
+    их читают все, и сигнала в этом нет.
+    """
+    following = _grouped(_follow_pairs('user_id', user_ids, 'author_id'))
+    stars = set(AuthorStats.objects.filter(
+        followers_count__gt=CELEBRITY_FOLLOWERS).values_list(
+        'user_id', flat=True))
+    authors = {author for authors in following.values()
+               for author in authors} - stars
+    followers = _grouped(_follow_pairs('author_id', authors, 'user_id'))
+    readers = {reader for users in followers.values() for reader in users}
+    their_follows = _grouped(_follow_pairs('user_id', readers, 'author_id'))
+    scores = {}
+    for user_id, own in following.items():
+        counter = Counter()
+        for author_id in own:
+            for reader in followers.get(author_id, ()):
+                if reader != user_id:
+                    counter.update(their_follows.get(reader, ()))
+        for seen in (*own, user_id):
+            counter.pop(seen, None)
+        scores[user_id] = counter
+    return scores
+
+
+def compute_suggestions(batch_size=SUGGESTION_BATCH_SIZE, progress=None):
+    """Пересчитывает FollowSuggestion для всех, у кого есть подписки.
+
+    Читатели идут пачками по возрастанию id; каждая пачка заменяет
+    свои подсказки в отдельной транзакции.
+    """
+    readers = Follow.objects.order_by('user_id').values_list(
+        'user_id', flat=True).distinct()
+    done = last = 0
+    while True:
+        batch = list(readers.filter(user_id__gt=last)[:batch_size])
+        if not batch:
+            break
+        scores = score_suggestions(batch)
+        with transaction.atomic():
+            FollowSuggestion.objects.filter(user_id__in=batch).delete()
+            bulk_create_in_chunks(
+                FollowSuggestion,
+                (FollowSuggestion(user_id=user_id, author_id=author_id,
+                                  score=score)
+                 for user_id, counter in scores.items()
+                 for author_id, score in counter.most_common(
+                     SUGGESTIONS_PER_USER)))
+        done += len(batch)
+        last = batch[-1]
+        if progress is not None:
+            progress(done)
+    # У тех, кто отписался ото всех, старые подсказки больше не верны.
+    FollowSuggestion.objects.exclude(
+        user_id__in=Follow.objects.values('user_id')).delete()
+    return done
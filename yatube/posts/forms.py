@@ -1,5 +1,8 @@
+from .follows import FOLLOW_LIST_LIMIT
+from .images import process_upload
 from .models import Post, Comment
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
 
 class PostForm(forms.ModelForm):
@@ -9,9 +12,29 @@ class PostForm(forms.ModelForm):
         labels = {'text': 'Write text', 'group': 'Choose group',
                   'image': 'Choose image'}
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            # Новый файл; имя уже сохранённой копии — строкой.
+            return process_upload(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
         model = Comment
         fields = ['text']
         labels = {'text': 'Write your comment, please :)'}
+
+
+class FollowListForm(forms.Form):
+    usernames = forms.CharField(
+        widget=forms.Textarea,
+        label='Usernames, separated by spaces or new lines')
+
+    def clean_usernames(self):
+        usernames = self.cleaned_data['usernames'].split()
+        if len(usernames) > FOLLOW_LIST_LIMIT:
+            raise forms.ValidationError(
+                f'Не больше {FOLLOW_LIST_LIMIT} авторов за раз.')
+        return usernames
@@ -0,0 +1,112 @@
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+from .models import Post
+
+# Версия конвейера входит в имя файла: при смене настроек ниже
+# старые результаты не выдаются за новые.
+PIPELINE_VERSION = b'1'
+IMAGE_MAX_BYTES = 20 * 1024 * 1024
+IMAGE_MAX_PIXELS = 40 * 1000 * 1000
+IMAGE_MAX_EDGE = 1920
+IMAGE_QUALITY = 82
+
+_executor = None
+_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'IMAGE_WORKERS', 2),
+                thread_name_prefix='images')
+        return _executor
+
+
+def output_format(image):
+    """(формат, расширение, параметры save) по режиму из заголовка."""
+    transparent = (image.mode in ('RGBA', 'LA', 'PA')
+                   or 'transparency' in image.info)
+    if features.check('webp'):
+        return 'WEBP', 'webp', {'quality': IMAGE_QUALITY, 'method': 4}
+    if transparent:
+        return 'PNG', 'png', {'optimize': True}
+    return 'JPEG', 'jpg', {'quality': IMAGE_QUALITY, 'optimize': True,
+                           'progressive': True}
+
+
+def upload_digest(uploaded):
+    """sha256 загрузки, прочитанной по кускам: память не растёт."""
+    digest = hashlib.sha256(PIPELINE_VERSION)
+    for chunk in uploaded.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _encode(uploaded, fmt, params):
+    uploaded.seek(0)
+    with Image.open(uploaded) as image:
+        # Для JPEG декодер сразу уменьшает картинку в 2-8 раз.
+        image.draft('RGB', (IMAGE_MAX_EDGE, IMAGE_MAX_EDGE))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((IMAGE_MAX_EDGE, IMAGE_MAX_EDGE), Image.LANCZOS)
+        if fmt == 'JPEG':
+            image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        buffer = BytesIO()
+        # Без exif и icc_profile: метаданные в файл не попадают.
+        image.save(buffer, fmt, **params)
+    return buffer.getvalue()
+
+
+def _touch(name):
+    """Освежает mtime: сборщик мусора не тронет снова нужный файл."""
+    try:
+        os.utime(default_storage.path(name))
+    except (NotImplementedError, FileNotFoundError):
+        pass
+
+
+def process_upload(uploaded):
+    """Готовит загруженную картинку к хранению.
+
+    Размеры проверяются по заголовку до декодирования. Одинаковые
+    загрузки получают одно имя по хешу содержимого, и если такой файл
+    уже есть, возвращается его имя без повторной обработки. Иначе
+    картинка уменьшается до IMAGE_MAX_EDGE и перекодируется в пуле
+    IMAGE_WORKERS потоков, что ограничивает память под декодирование.
+    """
+    if uploaded.size > IMAGE_MAX_BYTES:
+        raise ValidationError(
+            f'Файл больше {IMAGE_MAX_BYTES // (1024 * 1024)} МБ.')
+    uploaded.seek(0)
+    with Image.open(uploaded) as image:
+        width, height = image.size
+        fmt, ext, params = output_format(image)
+    if width * height > IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            f'Картинка {width}x{height} слишком велика.')
+    digest = upload_digest(uploaded)
+    name = f'{digest[:2]}/{digest}.{ext}'
+    stored = Post._meta.get_field('image').upload_to + name
+    if default_storage.exists(stored):
+        _touch(stored)
+        return stored
+    if getattr(settings, 'IMAGE_WORKERS', 2):
+        content = _get_executor().submit(
+            _encode, uploaded, fmt, params).result()
+    else:
+        content = _encode(uploaded, fmt, params)
+    return ContentFile(content, name=name)
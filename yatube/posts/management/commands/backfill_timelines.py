@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from posts.timeline import BACKFILL_FOLLOWERS_BATCH, backfill_demoted
+
+
+class Command(BaseCommand):
+    help = ('Раскладывает по лентам подписчиков посты авторов, которые '
+            'перестали быть «звёздами». Запускается периодически, '
+            'например из cron.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=BACKFILL_FOLLOWERS_BATCH)
+
+    def handle(self, *args, **options):
+        def progress(done):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'авторов разложено: {done}')
+
+        done = backfill_demoted(options['batch_size'], progress)
+        self.stdout.write(self.style.SUCCESS(
+            f'Ленты дополнены постами {done} авторов.'))
@@ -0,0 +1,72 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from posts.models import Comment, Follow, Group, Post, User
+from posts.timeline import FollowFeed
+from posts.utils import PAGE_FOR_LIST, seek_filter
+
+# SQLite: «SCAN t» без индекса и «USE TEMP B-TREE FOR ORDER BY»;
+# PostgreSQL: «Seq Scan» и узел «Sort».
+FULL_SCAN = re.compile(r'\bSCAN (TABLE )?\w+$|\bSeq Scan\b', re.MULTILINE)
+SORT = re.compile(r'TEMP B-TREE FOR ORDER BY|^\s*(->\s*)?Sort\b',
+                  re.MULTILINE)
+
+
+def first_pk(model):
+    return model.objects.order_by('pk').values_list(
+        'pk', flat=True).first() or 0
+
+
+def feed_queries():
+    """Запросы страниц лент в том виде, в каком их строит KeysetPaginator."""
+    author_id = first_pk(User)
+    group_id = first_pk(Group)
+    cursor = (timezone.now(), 0)
+    ordering = ('-pub_date', '-pk')
+    feeds = {
+        'posts:index': Post.objects.feed(),
+        'posts:group_posts': Post.objects.feed().filter(group_id=group_id),
+        'posts:profile': Post.objects.feed().filter(author_id=author_id),
+    }
+    for name, queryset in feeds.items():
+        queryset = queryset.order_by(*ordering)
+        yield name, queryset
+        yield f'{name} (cursor)', queryset.filter(
+            seek_filter('pub_date', 'pk', cursor, 'lt'))
+    for queryset, tiebreak, _ in FollowFeed(author_id).sources:
+        queryset = queryset.order_by('-pub_date', f'-{tiebreak}')
+        yield 'posts:follow_index', queryset
+        yield 'posts:follow_index (cursor)', queryset.filter(
+            seek_filter('pub_date', tiebreak, cursor, 'lt'))
+    comments = Comment.objects.filter(
+        post_id=first_pk(Post)).order_by('created', 'pk')
+    yield 'posts:post_comments', comments
+    yield 'posts:post_comments (cursor)', comments.filter(
+        seek_filter('created', 'pk', cursor, 'gt'))
+    yield 'fan-out', Follow.objects.filter(author_id=author_id).values_list(
+        'user_id', flat=True)
+
+
+def bad_plan(plan):
+    return bool(FULL_SCAN.search(plan) or SORT.search(plan))
+
+
+class Command(BaseCommand):
+    help = ('Проверяет через EXPLAIN, что запросы лент идут по индексам '
+            'без полного сканирования и сортировки.')
+
+    def handle(self, *args, **options):
+        failed = []
+        for name, queryset in feed_queries():
+            plan = queryset[:PAGE_FOR_LIST + 1].explain()
+            if bad_plan(plan):
+                failed.append(name)
+                self.stdout.write(self.style.ERROR(f'{name}:\n{plan}'))
+            elif options['verbosity'] > 1:
+                self.stdout.write(f'{name}:\n{plan}')
+        if failed:
+            raise CommandError(
+                'Полное сканирование или сортировка: ' + ', '.join(failed))
+        self.stdout.write(self.style.SUCCESS('Все запросы лент по индексам.'))
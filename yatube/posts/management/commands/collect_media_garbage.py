@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from posts.orphans import GC_BATCH_SIZE, GC_MIN_AGE, collect_garbage
+
+
+class Command(BaseCommand):
+    help = ('Удаляет картинки постов и миниатюры sorl, на которые больше '
+            'не ссылается ни один пост. С --every работает по расписанию.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что было бы удалено.')
+        parser.add_argument('--batch-size', type=int, default=GC_BATCH_SIZE)
+        parser.add_argument(
+            '--min-age', type=int, default=GC_MIN_AGE,
+            help='Не трогать файлы моложе стольких секунд.')
+        parser.add_argument(
+            '--every', type=int, default=0,
+            help='Повторять раз в столько секунд, пока не остановят.')
+
+    def handle(self, *args, **options):
+        while True:
+            self.collect(options)
+            if not options['every']:
+                break
+            time.sleep(options['every'])
+
+    def collect(self, options):
+        def progress(report):
+            if options['verbosity'] > 1:
+                self.stdout.write(self.summary(report))
+
+        started = time.monotonic()
+        report = collect_garbage(
+            options['dry_run'], options['batch_size'], options['min_age'],
+            progress)
+        elapsed = time.monotonic() - started
+        verb = 'Было бы удалено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb}: {self.summary(report)} за {elapsed:.1f} с.'))
+
+    def summary(self, report):
+        return '; '.join(
+            f'{prefix} {stats["files"]} файлов, '
+            f'{filesizeformat(stats["bytes"])}'
+            for prefix, stats in report.items())
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from posts.follows import SUGGESTION_BATCH_SIZE, compute_suggestions
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает подсказки «кого почитать» по графу подписок. '
+            'Запускается периодически, например из cron.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=SUGGESTION_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        def progress(done):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'читателей обработано: {done}')
+
+        done = compute_suggestions(options['batch_size'], progress)
+        self.stdout.write(self.style.SUCCESS(
+            f'Подсказки пересчитаны для {done} читателей.'))
@@ -0,0 +1,44 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.transfer import (COLUMNS, FORMATS, TRANSFER_BATCH_SIZE,
+                            export_rows, guess_format, write_rows)
+
+
+class Command(BaseCommand):
+    help = ('Выгружает группы, посты, комментарии или подписки '
+            'в NDJSON или CSV, не держа таблицу в памяти.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(COLUMNS))
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл для выгрузки; по умолчанию stdout.')
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument(
+            '--batch-size', type=int, default=TRANSFER_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or guess_format(path)
+        # Отчёт о ходе работы не должен попасть в сам поток выгрузки.
+        log = self.stderr if path == '-' else self.stdout
+        started = time.monotonic()
+        stream = (sys.stdout if path == '-'
+                  else open(path, 'w', encoding='utf-8', newline=''))
+        try:
+            rows = write_rows(
+                export_rows(options['kind'], options['batch_size']),
+                stream, fmt, COLUMNS[options['kind']])
+            total = 0
+            for total, _ in enumerate(rows, 1):
+                if total % options['batch_size'] == 0:
+                    log.write(f'{total} строк')
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+        elapsed = time.monotonic() - started
+        log.write(self.style.SUCCESS(
+            f'Выгружено {total} строк за {elapsed:.1f} с.'))
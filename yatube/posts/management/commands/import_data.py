@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.transfer import (COLUMNS, FORMATS, TRANSFER_BATCH_SIZE, Importer,
+                            guess_format, read_rows)
+
+
+class Command(BaseCommand):
+    help = ('Загружает группы, посты, комментарии или подписки из NDJSON '
+            'или CSV пачками bulk_create. Повторный запуск пропускает '
+            'уже загруженные строки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(COLUMNS))
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument(
+            '--batch-size', type=int, default=TRANSFER_BATCH_SIZE)
+        parser.add_argument(
+            '--images',
+            help='Каталог, из которого копируются картинки постов.')
+        parser.add_argument(
+            '--skip', type=int, default=0,
+            help='Не читать первые N строк: продолжение прерванного импорта.')
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or guess_format(options['path'])
+        skip = options['skip']
+        importer = Importer(options['kind'], images=options['images'],
+                            batch_size=options['batch_size'])
+        started = time.monotonic()
+
+        def progress(read, created):
+            rate = read / max(time.monotonic() - started, 1e-6)
+            self.stdout.write(
+                f'прочитано {skip + read}, добавлено {created}, '
+                f'{rate:.0f} строк/с')
+
+        with open(options['path'], encoding='utf-8', newline='') as stream:
+            rows = read_rows(stream, fmt)
+            for _ in range(skip):
+                next(rows, None)
+            try:
+                read, created = importer.run(rows, progress)
+            except (KeyError, ValueError) as error:
+                raise CommandError(
+                    f'Ошибка в пачке после строки {skip + importer.read}: '
+                    f'{error}. Продолжить: --skip {skip + importer.read}.')
+        self.stdout.write(self.style.SUCCESS(
+            f'Прочитано {read}, добавлено {created} за '
+            f'{time.monotonic() - started:.1f} с.'))
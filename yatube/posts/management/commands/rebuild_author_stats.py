@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.stats import rebuild_stats, stats_drift
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики авторов или проверяет их расхождение.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только сообщить о расхождениях, ничего не меняя.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        drift = stats_drift()
+        for user_id, counters in sorted(drift.items()):
+            for counter, (have, want) in counters.items():
+                self.stdout.write(
+                    f'user {user_id}: {counter} {have} -> {want}')
+        if options['check']:
+            if drift:
+                raise CommandError(
+                    f'Счётчики расходятся у {len(drift)} пользователей.')
+            self.stdout.write(self.style.SUCCESS('Расхождений нет.'))
+            return
+        rebuild_stats(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Счётчики пересчитаны, исправлено: {len(drift)}.'))
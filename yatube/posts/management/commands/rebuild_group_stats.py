@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.caching import GROUPS_FEED, bump_feeds
+from posts.stats import group_stats_drift, rebuild_group_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики групп или проверяет их расхождение.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только сообщить о расхождениях, ничего не меняя.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        drift = group_stats_drift()
+        for group_id, fields in sorted(drift.items()):
+            for field, (have, want) in fields.items():
+                self.stdout.write(
+                    f'group {group_id}: {field} {have} -> {want}')
+        if options['check']:
+            if drift:
+                raise CommandError(
+                    f'Счётчики расходятся у {len(drift)} групп.')
+            self.stdout.write(self.style.SUCCESS('Расхождений нет.'))
+            return
+        rebuild_group_stats(batch_size=options['batch_size'])
+        # Каталог групп закэширован по версии GROUPS_FEED.
+        bump_feeds(GROUPS_FEED)
+        self.stdout.write(self.style.SUCCESS(
+            f'Счётчики пересчитаны, исправлено: {len(drift)}.'))
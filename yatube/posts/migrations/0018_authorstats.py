@@ -0,0 +1,47 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:52
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count
+
+
+def fill_author_stats(apps, schema_editor):
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    sources = (
+        ('posts_count', apps.get_model('posts', 'Post'), 'author'),
+        ('comments_count', apps.get_model('posts', 'Comment'), 'author'),
+        ('followers_count', apps.get_model('posts', 'Follow'), 'author'),
+        ('following_count', apps.get_model('posts', 'Follow'), 'user'),
+    )
+    counters = {}
+    for counter, model, field in sources:
+        rows = (model.objects.order_by().values_list(field)
+                .annotate(total=Count('pk')))
+        for user_id, total in rows:
+            counters.setdefault(user_id, {})[counter] = total
+    AuthorStats.objects.bulk_create(
+        AuthorStats(user_id=user_id, **values)
+        for user_id, values in counters.items())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0017_auto_20230313_1822'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('posts_count', models.PositiveIntegerField(default=0)),
+                ('comments_count', models.PositiveIntegerField(default=0)),
+                ('followers_count', models.PositiveIntegerField(default=0)),
+                ('following_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_author_stats, migrations.RunPython.noop),
+    ]
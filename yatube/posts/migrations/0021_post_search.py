@@ -0,0 +1,50 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:40
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE posts_search USING fts5('
+            "body, tokenize='unicode61 remove_diacritics 2')")
+        insert = 'INSERT INTO posts_search (rowid, body) VALUES (%s, %s)'
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE TABLE posts_search ('
+            'post_id integer PRIMARY KEY '
+            'REFERENCES posts_post (id) ON DELETE CASCADE '
+            'DEFERRABLE INITIALLY DEFERRED, '
+            'document tsvector NOT NULL)')
+        schema_editor.execute(
+            'CREATE INDEX posts_search_document '
+            'ON posts_search USING gin (document)')
+        insert = ('INSERT INTO posts_search (post_id, document) '
+                  "VALUES (%s, to_tsvector('russian', %s))")
+    else:
+        return
+    Post = apps.get_model('posts', 'Post')
+    posts = Post.objects.select_related('group').iterator()
+    with schema_editor.connection.cursor() as cursor:
+        for post in posts:
+            parts = [post.text]
+            if post.group is not None:
+                parts += [post.group.title, post.group.description]
+            cursor.execute(insert, [post.pk, '\n'.join(parts)])
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Max
+
+
+def fill_group_stats(apps, schema_editor):
+    Group = apps.get_model('posts', 'Group')
+    GroupStats = apps.get_model('posts', 'GroupStats')
+    rows = Group.objects.annotate(
+        total=Count('groups'), newest=Max('groups__pub_date')).values_list(
+        'pk', 'total', 'newest')
+    GroupStats.objects.bulk_create(
+        GroupStats(group_id=group_id, posts_count=total, last_post_at=newest)
+        for group_id, total, newest in rows.iterator())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_post_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupStats',
+            fields=[
+                ('group', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='posts.Group')),
+                ('posts_count', models.PositiveIntegerField(default=0)),
+                ('last_post_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='groupstats',
+            index=models.Index(fields=['-last_post_at'], name='groupstats_last_post'),
+        ),
+        migrations.RunPython(fill_group_stats, migrations.RunPython.noop),
+    ]
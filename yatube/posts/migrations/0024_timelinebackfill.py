@@ -0,0 +1,23 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:23
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0023_followsuggestion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineBackfill',
+            fields=[
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='timeline_backfill', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('queued_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
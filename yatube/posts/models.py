@@ -14,6 +14,24 @@ class Group(models.Model):
         return self.title
 
 
+FEED_FIELDS = (
+    'text',
+    'pub_date',
+    'image',
+    'author',
+    'author__username',
+    'group',
+    'group__slug',
+    'group__title',
+)
+
+
+class PostQuerySet(models.QuerySet):
+    def feed(self):
+        """Посты для лент: автор и группа одним JOIN, только нужные поля."""
+        return self.select_related('author', 'group').only(*FEED_FIELDS)
+
+
 class Post(models.Model):
     text = models.TextField(verbose_name='Your post')
     pub_date = models.DateTimeField(auto_now_add=True, verbose_name='Date')
@@ -38,11 +56,23 @@ class Post(models.Model):
         blank=True
     )
 
+    objects = PostQuerySet.as_manager()
+
     def __str__(self):
         return self.text[:LETTERS_FOR_POST]
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='post_pub_date_id'),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_pub_date'),
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_pub_date'), ]
 
 
 class Comment(models.Model):
@@ -68,6 +98,12 @@ class Comment(models.Model):
         auto_now_add=True,
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=('post', 'created', 'id'),
+                name='comment_post_created'), ]
+
     def __str__(self):
         return self.text
 
@@ -90,6 +126,131 @@ class Follow(models.Model):
             models.UniqueConstraint(
                 fields=('user', 'author',),
                 name='уникальный фолловер'), ]
+        indexes = [
+            models.Index(
+                fields=('author', 'user'),
+                name='follow_author_user'), ]
 
     def __str__(self):
         return self.user
+
+
+class FollowSuggestion(models.Model):
+    """Кого почитать: результат пакетного расчёта по графу подписок."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='follow_suggestions',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    score = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'author'),
+                name='одна подсказка на автора'), ]
+        indexes = [
+            models.Index(
+                fields=('user', '-score'),
+                name='suggestion_user_score'), ]
+
+    def __str__(self):
+        return f'{self.user_id} -> {self.author_id}: {self.score}'
+
+
+class AuthorStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+    )
+    posts_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
+    COUNTERS = (
+        'posts_count',
+        'comments_count',
+        'followers_count',
+        'following_count',
+    )
+
+    def __str__(self):
+        return f'{self.user_id}: {self.posts_count} posts'
+
+
+class GroupStats(models.Model):
+    """Каталог групп: число постов и время последнего без GROUP BY."""
+    group = models.OneToOneField(
+        Group,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+    )
+    posts_count = models.PositiveIntegerField(default=0)
+    last_post_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=('-last_post_at',),
+                name='groupstats_last_post'), ]
+
+    def __str__(self):
+        return f'{self.group_id}: {self.posts_count} posts'
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'post'),
+                name='один пост в ленте один раз'), ]
+        indexes = [
+            models.Index(
+                fields=('user', '-pub_date', '-post'),
+                name='timeline_user_pub_date'),
+            models.Index(
+                fields=('user', 'author'),
+                name='timeline_user_author'), ]
+
+    def __str__(self):
+        return f'{self.user_id}: {self.post_id}'
+
+
+class TimelineBackfill(models.Model):
+    """Автор, который перестал быть «звездой»: его посты ещё не в лентах."""
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='timeline_backfill',
+    )
+    queued_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.author_id}: {self.queued_at}'
@@ -0,0 +1,129 @@
+import os
+import time
+from collections import Counter
+
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+
+from .models import Post
+from .thumbnails import thumbnail_names
+
+# Пачка сверяется с БД одним IN: старые SQLite держат 999 параметров.
+GC_BATCH_SIZE = 500
+# Файлы моложе этого не трогаем: форма сохраняет картинку раньше,
+# чем пост с ней попадает в БД.
+GC_MIN_AGE = 60 * 60
+
+
+def stored_files(prefix):
+    """(имя, DirEntry) всех файлов под prefix, обходом os.scandir.
+
+    Каталоги читаются потоково, без списков на миллионы имён.
+    """
+    location = default.storage.path('')
+    stack = [default.storage.path(prefix)]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                else:
+                    name = os.path.relpath(entry.path, location)
+                    yield name.replace(os.sep, '/'), entry
+
+
+def _size_if_old(entry, deadline):
+    try:
+        stat = entry.stat(follow_symlinks=False)
+    except FileNotFoundError:
+        return None
+    return stat.st_size if stat.st_mtime < deadline else None
+
+
+def _old_files(prefix, deadline, batch_size):
+    """Пачки {имя: размер} файлов под prefix старше deadline."""
+    batch = {}
+    for name, entry in stored_files(prefix):
+        size = _size_if_old(entry, deadline)
+        if size is not None:
+            batch[name] = size
+            if len(batch) >= batch_size:
+                yield batch
+                batch = {}
+    if batch:
+        yield batch
+
+
+def _still_used(names):
+    """Имена из пачки, на которые ссылается хоть один пост."""
+    return set(Post.objects.filter(image__in=names).values_list(
+        'image', flat=True))
+
+
+def _thumbnails_of(names):
+    """{имя: размер} существующих миниатюр картинок names.
+
+    Записи sorl помнят все нарезанные размеры, в том числе из шаблонов,
+    которых уже нет; имена по THUMBNAIL_GEOMETRIES выручают, если
+    запись вытеснена из кэша.
+    """
+    kvstore = default.kvstore
+    thumbnails = set()
+    for name in names:
+        thumbnails.update(thumbnail_names(name))
+        source = ImageFile(name, default.storage)
+        for key in kvstore._get(source.key, identity='thumbnails') or ():
+            thumbnail = kvstore._get(key)
+            if thumbnail:
+                thumbnails.add(thumbnail.name)
+    sizes = {}
+    for name in thumbnails:
+        try:
+            sizes[name] = default.storage.size(name)
+        except FileNotFoundError:
+            continue
+    return sizes
+
+
+def _delete(names):
+    keys = []
+    for name in names:
+        default.storage.delete(name)
+        key = ImageFile(name, default.storage).key
+        keys += [add_prefix(key), add_prefix(key, 'thumbnails')]
+    # Записи sorl удаляются пачкой, иначе шаблон получит битую миниатюру.
+    default.kvstore._delete_raw(*keys)
+
+
+def collect_garbage(dry_run=False, batch_size=GC_BATCH_SIZE,
+                    min_age=GC_MIN_AGE, progress=None):
+    """Удаляет оригиналы, на которые не ссылается ни один пост, с миниатюрами.
+
+    Возвращает {каталог: Counter(files=..., bytes=...)}. Оригиналы
+    читаются с диска пачками, и каждая пачка сверяется с БД одним
+    запросом, так что память не зависит от числа файлов. Миниатюра
+    удаляется только вместе со своим оригиналом: по имени её файла
+    не понять, чья она.
+    """
+    deadline = time.time() - min_age
+    upload_to = Post._meta.get_field('image').upload_to
+    report = {upload_to: Counter(), sorl_settings.THUMBNAIL_PREFIX: Counter()}
+    for batch in _old_files(upload_to, deadline, batch_size):
+        for name in _still_used(batch):
+            del batch[name]
+        thumbnails = _thumbnails_of(batch)
+        if not dry_run:
+            _delete([*batch, *thumbnails])
+        for prefix, files in ((upload_to, batch),
+                              (sorl_settings.THUMBNAIL_PREFIX, thumbnails)):
+            report[prefix]['files'] += len(files)
+            report[prefix]['bytes'] += sum(files.values())
+        if progress is not None:
+            progress(report)
+    return report
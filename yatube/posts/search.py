@@ -0,0 +1,76 @@
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .models import Post
+
+SEARCH_TABLE = 'posts_search'
+SEARCH_CONFIG = 'russian'
+WORD = re.compile(r'\w+')
+
+
+def document(post):
+    """Текст, по которому ищется пост: сам пост и его группа."""
+    parts = [post.text]
+    if post.group_id is not None:
+        parts += [post.group.title, post.group.description]
+    return '\n'.join(parts)
+
+
+def index_posts(posts):
+    """Переиндексирует посты; для других СУБД поиск идёт через LIKE."""
+    vendor = connection.vendor
+    rows = [(post.pk, document(post)) for post in posts]
+    if not rows or vendor not in ('sqlite', 'postgresql'):
+        return
+    with connection.cursor() as cursor:
+        if vendor == 'sqlite':
+            cursor.executemany(
+                f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s',
+                [(pk,) for pk, _ in rows])
+            cursor.executemany(
+                f'INSERT INTO {SEARCH_TABLE} (rowid, body) VALUES (%s, %s)',
+                rows)
+        else:
+            cursor.executemany(
+                f'INSERT INTO {SEARCH_TABLE} (post_id, document) '
+                f'VALUES (%s, to_tsvector(\'{SEARCH_CONFIG}\', %s)) '
+                'ON CONFLICT (post_id) DO UPDATE '
+                'SET document = EXCLUDED.document',
+                rows)
+
+
+def unindex_post(post_id):
+    vendor = connection.vendor
+    key = {'sqlite': 'rowid', 'postgresql': 'post_id'}.get(vendor)
+    if key:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {SEARCH_TABLE} WHERE {key} = %s', [post_id])
+
+
+def matching_ids(query):
+    """Подзапрос id постов, подходящих под запрос; None — искать нечего."""
+    words = WORD.findall(query)
+    if not words:
+        return None
+    if connection.vendor == 'sqlite':
+        # Каждое слово в кавычках: пользовательский ввод не станет
+        # синтаксисом FTS5, а звёздочка ищет по префиксу.
+        match = ' '.join(f'"{word}"*' for word in words)
+        return RawSQL(
+            f'SELECT rowid FROM {SEARCH_TABLE} '
+            f'WHERE {SEARCH_TABLE} MATCH %s', [match])
+    if connection.vendor == 'postgresql':
+        return RawSQL(
+            f'SELECT post_id FROM {SEARCH_TABLE} WHERE document @@ '
+            f'plainto_tsquery(\'{SEARCH_CONFIG}\', %s)', [' '.join(words)])
+    return Post.objects.filter(text__icontains=query).values('pk')
+
+
+def search_posts(queryset, query):
+    ids = matching_ids(query)
+    if ids is None:
+        return queryset.none()
+    return queryset.filter(pk__in=ids)
@@ -0,0 +1,143 @@
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from .caching import (GROUPS_FEED, INDEX_FEED, bump_feeds, group_feed,
+                      post_feed, profile_feed)
+from .models import Comment, Follow, Group, GroupStats, Post
+from .search import index_posts, unindex_post
+from .stats import bump, group_post_added, group_post_removed
+from .timeline import backfill, demote_if_crossed, fan_out, trim
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, **kwargs):
+    if created:
+        bump(instance.author_id, 'posts_count', 1)
+        fan_out(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    bump(instance.author_id, 'posts_count', -1)
+
+
+@receiver(post_save, sender=Post)
+def post_group_changed(sender, instance, created, **kwargs):
+    # Стоит раньше invalidate_post_feeds: тот перезапишет _loaded_group_id.
+    if 'group_id' in instance.get_deferred_fields():
+        return
+    old = None if created else instance._loaded_group_id
+    if old == instance.group_id:
+        return
+    if old is not None:
+        group_post_removed(old, instance.pub_date)
+    if instance.group_id is not None:
+        group_post_added(instance.group_id, instance.pub_date)
+    bump_feeds(GROUPS_FEED)
+
+
+@receiver(post_delete, sender=Post)
+def post_left_group(sender, instance, **kwargs):
+    if instance.group_id is not None:
+        group_post_removed(instance.group_id, instance.pub_date)
+        bump_feeds(GROUPS_FEED)
+
+
+@receiver(post_save, sender=Group)
+def group_created(sender, instance, created, **kwargs):
+    if created:
+        GroupStats.objects.get_or_create(group=instance)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        bump(instance.author_id, 'comments_count', 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    bump(instance.author_id, 'comments_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        bump(instance.author_id, 'followers_count', 1)
+        bump(instance.user_id, 'following_count', 1)
+        backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    bump(instance.author_id, 'followers_count', -1)
+    bump(instance.user_id, 'following_count', -1)
+    trim(instance.user_id, instance.author_id)
+    demote_if_crossed(instance.author_id)
+
+
+@receiver(post_init, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    # group_id может быть отложен через only(), поэтому без обращения к БД.
+    instance._loaded_group_id = instance.__dict__.get('group_id')
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_feeds(sender, instance, **kwargs):
+    feeds = {INDEX_FEED, profile_feed(instance.author_id),
+             post_feed(instance.pk)}
+    for group_id in (instance.group_id, instance._loaded_group_id):
+        if group_id is not None:
+            feeds.add(group_feed(group_id))
+    bump_feeds(*feeds)
+    instance._loaded_group_id = instance.group_id
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def invalidate_group_feeds(sender, instance, created=False, **kwargs):
+    # Заголовок и slug группы видны в каталоге, в ленте группы,
+    # на главной и в профилях тех, кто в ней писал.
+    feeds = {group_feed(instance.pk), GROUPS_FEED}
+    if not created:
+        authors = (Post.objects.filter(group=instance).order_by()
+                   .values_list('author_id', flat=True).distinct())
+        feeds.add(INDEX_FEED)
+        feeds.update(profile_feed(author_id) for author_id in authors)
+    bump_feeds(*feeds)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_feeds(sender, instance, **kwargs):
+    if instance.post_id is not None:
+        bump_feeds(post_feed(instance.post_id))
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    index_posts([instance])
+
+
+@receiver(post_delete, sender=Post)
+def unindex_deleted_post(sender, instance, **kwargs):
+    unindex_post(instance.pk)
+
+
+@receiver(post_save, sender=Group)
+def reindex_group_posts(sender, instance, created, **kwargs):
+    if not created:
+        index_posts(instance.groups.select_related('group'))
+
+
+@receiver(pre_delete, sender=Group)
+def remember_group_posts(sender, instance, **kwargs):
+    instance._post_ids = list(instance.groups.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Group)
+def reindex_ungrouped_posts(sender, instance, **kwargs):
+    # Посты уже отвязаны от группы (SET_NULL), её текст из индекса убираем.
+    index_posts(Post.objects.filter(pk__in=instance._post_ids))
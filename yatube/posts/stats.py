@@ -0,0 +1,147 @@
+from django.db import transaction
+from django.db.models import (Case, Count, DateTimeField, F, Max, Q,
+                              Subquery, Value, When)
+
+from .models import AuthorStats, Comment, Follow, Group, GroupStats, Post
+from .utils import bulk_create_in_chunks
+
+
+def author_stats(user):
+    """Счётчики автора без записи в БД: для новых авторов — нули."""
+    try:
+        return AuthorStats.objects.get(user=user)
+    except AuthorStats.DoesNotExist:
+        return AuthorStats(user=user)
+
+
+def bump(user_id, counter, delta):
+    """Атомарно сдвигает счётчик на delta одним UPDATE."""
+    rows = AuthorStats.objects.filter(user_id=user_id)
+    if delta < 0:
+        rows = rows.filter(**{f'{counter}__gte': -delta})
+    updated = rows.update(**{counter: F(counter) + delta})
+    if updated or delta < 0:
+        return
+    stats, created = AuthorStats.objects.get_or_create(
+        user_id=user_id, defaults={counter: delta})
+    if not created:
+        rows.update(**{counter: F(counter) + delta})
+
+
+def bump_many(user_ids, counter, delta):
+    """bump для многих пользователей сразу: один UPDATE на всех."""
+    user_ids = set(user_ids)
+    rows = AuthorStats.objects.filter(user_id__in=user_ids)
+    if delta < 0:
+        rows = rows.filter(**{f'{counter}__gte': -delta})
+    rows.update(**{counter: F(counter) + delta})
+    if delta < 0:
+        return
+    # Строки счётчиков нет только у совсем новых пользователей.
+    have = set(AuthorStats.objects.filter(
+        user_id__in=user_ids).values_list('user_id', flat=True))
+    for user_id in user_ids - have:
+        bump(user_id, counter, delta)
+
+
+def actual_stats():
+    """Считает счётчики заново по исходным таблицам: {user_id: {...}}."""
+    sources = (
+        ('posts_count', Post.objects, 'author'),
+        ('comments_count', Comment.objects, 'author'),
+        ('followers_count', Follow.objects, 'author'),
+        ('following_count', Follow.objects, 'user'),
+    )
+    result = {}
+    for counter, manager, field in sources:
+        rows = (manager.order_by().values_list(field)
+                .annotate(total=Count('pk')))
+        for user_id, total in rows:
+            result.setdefault(user_id, {})[counter] = total
+    return result
+
+
+def stats_drift():
+    """Расхождения: {user_id: {counter: (хранится, на самом деле)}}."""
+    actual = actual_stats()
+    stored = {
+        stats.user_id: stats for stats in AuthorStats.objects.all()}
+    drift = {}
+    for user_id in actual.keys() | stored.keys():
+        stats = stored.get(user_id, AuthorStats())
+        for counter in AuthorStats.COUNTERS:
+            have = getattr(stats, counter)
+            want = actual.get(user_id, {}).get(counter, 0)
+            if have != want:
+                drift.setdefault(user_id, {})[counter] = (have, want)
+    return drift
+
+
+@transaction.atomic
+def rebuild_stats(batch_size=1000):
+    AuthorStats.objects.all().delete()
+    bulk_create_in_chunks(
+        AuthorStats,
+        (AuthorStats(user_id=user_id, **counters)
+         for user_id, counters in actual_stats().items()),
+        batch_size)
+
+
+def group_post_added(group_id, pub_date):
+    """+1 пост в группе и, если он новее, время последнего — одним UPDATE."""
+    rows = GroupStats.objects.filter(group_id=group_id)
+    updated = rows.update(
+        posts_count=F('posts_count') + 1,
+        last_post_at=Case(
+            When(last_post_at__gte=pub_date, then=F('last_post_at')),
+            default=Value(pub_date, output_field=DateTimeField())))
+    if not updated:
+        stats, created = GroupStats.objects.get_or_create(
+            group_id=group_id,
+            defaults={'posts_count': 1, 'last_post_at': pub_date})
+        if not created:
+            group_post_added(group_id, pub_date)
+
+
+def group_post_removed(group_id, pub_date):
+    """-1 пост; если ушёл последний пост, время берётся из индекса."""
+    rows = GroupStats.objects.filter(group_id=group_id)
+    rows.filter(posts_count__gte=1).update(posts_count=F('posts_count') - 1)
+    newest = Post.objects.filter(group_id=group_id).order_by(
+        '-pub_date', '-pk').values_list('pub_date', flat=True)[:1]
+    rows.filter(
+        Q(last_post_at__lte=pub_date) | Q(last_post_at__isnull=True),
+    ).update(last_post_at=Subquery(newest))
+
+
+def actual_group_stats():
+    """Считает по постам заново: {group_id: (число постов, последний)}."""
+    rows = Group.objects.annotate(
+        total=Count('groups'), newest=Max('groups__pub_date')).values_list(
+        'pk', 'total', 'newest')
+    return {group_id: (total, newest)
+            for group_id, total, newest in rows.iterator()}
+
+
+def group_stats_drift():
+    """Расхождения: {group_id: {поле: (хранится, на самом деле)}}."""
+    stored = {stats.group_id: stats for stats in GroupStats.objects.all()}
+    drift = {}
+    for group_id, values in actual_group_stats().items():
+        stats = stored.get(group_id, GroupStats())
+        for field, want in zip(('posts_count', 'last_post_at'), values):
+            have = getattr(stats, field)
+            if have != want:
+                drift.setdefault(group_id, {})[field] = (have, want)
+    return drift
+
+
+@transaction.atomic
+def rebuild_group_stats(batch_size=1000):
+    GroupStats.objects.all().delete()
+    bulk_create_in_chunks(
+        GroupStats,
+        (GroupStats(group_id=group_id, posts_count=total,
+                    last_post_at=newest)
+         for group_id, (total, newest) in actual_group_stats().items()),
+        batch_size)
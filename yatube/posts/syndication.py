@@ -0,0 +1,150 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed, Rss201rev2Feed
+from django.utils.text import Truncator
+from django.utils.xmlutils import SimplerXMLGenerator
+
+from .caching import FEED_CACHE_TIMEOUT, feed_cache_key
+from .utils import KeysetPaginator, attach_cursors
+
+FEED_ITEMS = 20
+TITLE_LETTERS = 60
+# Только то, что попадает в XML: без JOIN групп и без картинок.
+FEED_FIELDS = ('pk', 'text', 'pub_date', 'author__username')
+
+
+class StreamingFeedMixin:
+    """Отдаёт ленту кусками: шапка, затем по записи, затем хвост.
+
+    Записи приходят итератором строк .values() и не копятся в
+    self.items, как в обычном write().
+    """
+
+    item_element = None
+
+    def latest_post_date(self):
+        return self.feed['newest'] or super().latest_post_date()
+
+    def add_root_elements(self, handler):
+        super().add_root_elements(handler)
+        if self.feed['next_url']:
+            handler.addQuickElement(
+                self.link_element, '',
+                {'rel': 'next', 'href': self.feed['next_url']})
+
+    def stream(self, items):
+        buffer = StringIO()
+        handler = SimplerXMLGenerator(buffer, 'utf-8')
+
+        def drain():
+            chunk = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            return chunk
+
+        handler.startDocument()
+        self.start_feed(handler)
+        yield drain()
+        for item in items:
+            self.add_item(**item)
+            item = self.items.pop()
+            handler.startElement(self.item_element,
+                                 self.item_attributes(item))
+            self.add_item_elements(handler, item)
+            handler.endElement(self.item_element)
+            yield drain()
+        self.end_feed(handler)
+        yield drain()
+
+
+class StreamingRssFeed(StreamingFeedMixin, Rss201rev2Feed):
+    item_element = 'item'
+    link_element = 'atom:link'
+
+    def start_feed(self, handler):
+        handler.startElement('rss', self.rss_attributes())
+        handler.startElement('channel', self.root_attributes())
+        self.add_root_elements(handler)
+
+    def end_feed(self, handler):
+        self.endChannelElement(handler)
+        handler.endElement('rss')
+
+
+class StreamingAtomFeed(StreamingFeedMixin, Atom1Feed):
+    item_element = 'entry'
+    link_element = 'link'
+
+    def start_feed(self, handler):
+        handler.startElement('feed', self.root_attributes())
+        self.add_root_elements(handler)
+
+    def end_feed(self, handler):
+        handler.endElement('feed')
+
+
+FORMATS = {
+    'rss': StreamingRssFeed,
+    'atom': StreamingAtomFeed,
+}
+
+
+def feed_items(request, rows):
+    for row in rows:
+        link = request.build_absolute_uri(
+            reverse('posts:post_detail', args=[row['pk']]))
+        yield {
+            'title': Truncator(row['text']).chars(TITLE_LETTERS),
+            'link': link,
+            'unique_id': link,
+            'description': row['text'],
+            'pubdate': row['pub_date'],
+            'author_name': row['author__username'],
+        }
+
+
+def _cached(key, chunks):
+    """Пропускает куски дальше и кладёт всю ленту в кэш в конце.
+
+    Если клиент оборвал чтение, неполная лента в кэш не попадёт.
+    """
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    cache.set(key, ''.join(parts), FEED_CACHE_TIMEOUT)
+
+
+def feed_response(request, posts, feeds, **channel):
+    """RSS (или Atom при ?format=atom) по постам posts.
+
+    Страница берётся по курсору ?after= и узким .values(). Готовая
+    лента кэшируется по версиям feeds, которые сдвигает каждый новый
+    или изменённый пост.
+    """
+    feed_class = FORMATS.get(request.GET.get('format', 'rss'))
+    if feed_class is None:
+        raise Http404('Неизвестный формат ленты')
+    key = 'syndication:' + feed_cache_key(request, *feeds)
+    cached = cache.get(key)
+    if cached is not None:
+        return HttpResponse(cached, content_type=feed_class.content_type)
+    paginator = KeysetPaginator(posts.values(*FEED_FIELDS), FEED_ITEMS)
+    page = attach_cursors(paginator.page_after(request.GET.get('after', '')))
+    next_url = None
+    if page.has_next():
+        params = request.GET.copy()
+        params['after'] = page.next_cursor
+        next_url = request.build_absolute_uri('?' + params.urlencode())
+    rows = list(page)
+    feed = feed_class(
+        link=request.build_absolute_uri(channel.pop('link')),
+        feed_url=request.build_absolute_uri(request.get_full_path()),
+        newest=rows[0]['pub_date'] if rows else None,
+        next_url=next_url, **channel)
+    return StreamingHttpResponse(
+        _cached(key, feed.stream(feed_items(request, rows))),
+        content_type=feed_class.content_type)
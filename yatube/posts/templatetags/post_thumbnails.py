@@ -0,0 +1,31 @@
+from django import template
+
+from posts.thumbnails import prefetch
+
+register = template.Library()
+
+
+class PrefetchThumbnailsNode(template.Node):
+    def __init__(self, posts, nodelist):
+        self.posts = posts
+        self.nodelist = nodelist
+
+    def render(self, context):
+        with prefetch(self.posts.resolve(context)):
+            return self.nodelist.render(context)
+
+
+@register.tag
+def prefetch_thumbnails(parser, token):
+    """{% prefetch_thumbnails page_obj %}...{% endprefetch_thumbnails %}
+
+    Теги {% thumbnail %} внутри блока читают записи, полученные одним
+    запросом для всех постов страницы.
+    """
+    bits = token.split_contents()
+    if len(bits) != 2:
+        raise template.TemplateSyntaxError(
+            f'{bits[0]} принимает один аргумент: список постов')
+    nodelist = parser.parse(('endprefetch_thumbnails',))
+    parser.delete_first_token()
+    return PrefetchThumbnailsNode(parser.compile_filter(bits[1]), nodelist)
@@ -0,0 +1,185 @@
+from ..models import Group, Post, Comment, Follow, TimelineEntry
+from .. import thumbnails
+from ..search import search_posts
+from ..transfer import Importer
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from io import StringIO
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+User = get_user_model()
+SMALL_GIF = (b'\x47\x49\x46\x38\x39\x61\x02\x00'
+             b'\x01\x00\x80\x00\x00\x00\x00\x00'
+             b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+             b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+             b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+             b'\x0A\x00\x3B')
+
+
+class TransferCommandsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmp_dir = tempfile.mkdtemp()
+        author = User.objects.create_user(username='gol43')
+        reader = User.objects.create_user(username='fol43')
+        group = Group.objects.create(
+            title='Сады', slug='gardens', description='Про яблони')
+        post = Post.objects.create(text='Сажаем, яблони', author=author,
+                                   group=group)
+        Post.objects.filter(pk=post.pk).update(
+            pub_date=post.pub_date - timedelta(days=30))
+        Post.objects.create(text='Без группы', author=reader)
+        Comment.objects.create(post=post, author=reader, text='Ура, "да"')
+        Follow.objects.create(user=reader, author=author)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp_dir, ignore_errors=True)
+        super().tearDownClass()
+
+    def snapshot(self):
+        return (
+            list(Group.objects.values_list('slug', 'title', 'description')),
+            list(Post.objects.order_by('pk').values_list(
+                'pk', 'author__username', 'group__slug', 'pub_date', 'text')),
+            list(Comment.objects.order_by('pk').values_list(
+                'pk', 'post_id', 'author__username', 'created', 'text')),
+            list(Follow.objects.values_list(
+                'user__username', 'author__username')),
+        )
+
+    def round_trip(self, extension):
+        before = self.snapshot()
+        kinds = ('groups', 'posts', 'comments', 'follows')
+        for kind in kinds:
+            path = os.path.join(self.tmp_dir, kind + extension)
+            call_command('export_data', kind, path, stdout=StringIO())
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        for _ in range(2):
+            for kind in kinds:
+                path = os.path.join(self.tmp_dir, kind + extension)
+                call_command('import_data', kind, path, batch_size=2,
+                             stdout=StringIO())
+        self.assertEqual(self.snapshot(), before)
+
+    def test_round_trip_ndjson(self):
+        """выгрузка и повторная загрузка сохраняют данные и даты"""
+        self.round_trip('.ndjson')
+        reader = User.objects.get(username='fol43')
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=reader).count(), 1)
+        self.assertEqual(
+            search_posts(Post.objects.all(), 'яблони').count(), 1)
+        call_command('rebuild_author_stats', check=True, stdout=StringIO())
+
+    def test_round_trip_csv(self):
+        self.round_trip('.csv')
+
+    def test_import_keeps_auto_now_add_for_others(self):
+        """импорт не выключает auto_now_add у моделей во всём процессе"""
+        author = User.objects.get(username='gol43')
+        rows = [{'id': 100, 'author': 'gol43', 'group': None,
+                 'pub_date': '2020-01-01T00:00:00+00:00', 'text': 'Старый',
+                 'image': ''}]
+        created = []
+        Importer('posts').run(rows, progress=lambda *counts: created.append(
+            Post.objects.create(text='Рядом', author=author)))
+        self.assertEqual(Post.objects.get(pk=100).pub_date.year, 2020)
+        self.assertEqual(TimelineEntry.objects.get(post_id=100).pub_date,
+                         Post.objects.get(pk=100).pub_date)
+        self.assertIsNotNone(created[0].pub_date)
+
+    def test_unknown_group_stops_import(self):
+        path = os.path.join(self.tmp_dir, 'broken.ndjson')
+        with open(path, 'w') as stream:
+            stream.write('{"id": 100, "author": "new", "group": "nope", '
+                         '"pub_date": null, "text": "x", "image": ""}\n')
+        with self.assertRaisesMessage(CommandError, 'nope'):
+            call_command('import_data', 'posts', path, stdout=StringIO())
+        self.assertFalse(Post.objects.filter(pk=100).exists())
+
+
+class MediaGarbageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.settings_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.settings_override.enable()
+        cls.user = User.objects.create_user(username='gol43')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def image(self, name):
+        return SimpleUploadedFile(name, SMALL_GIF, content_type='image/gif')
+
+    def thumbnails_of(self, post):
+        backend = thumbnails.DeferredThumbnailBackend()
+        for geometry, options in thumbnails.THUMBNAIL_GEOMETRIES:
+            backend.generate(post.image, geometry, **options)
+        return list(thumbnails.thumbnail_names(post.image.name))
+
+    def collect(self, **options):
+        call_command('collect_media_garbage', stdout=StringIO(), **options)
+
+    def test_removes_only_unreferenced_files(self):
+        """удаляются оригиналы без постов и их миниатюры"""
+        kept = Post.objects.create(text='Есть', author=self.user,
+                                   image=self.image('kept.gif'))
+        gone = Post.objects.create(text='Нет', author=self.user,
+                                   image=self.image('gone.gif'))
+        kept_files = [kept.image.name, *self.thumbnails_of(kept)]
+        gone_files = [gone.image.name, *self.thumbnails_of(gone)]
+        gone_source = ImageFile(gone.image)
+        gone.delete()
+        self.collect(min_age=0, dry_run=True)
+        for name in gone_files:
+            self.assertTrue(default_storage.exists(name))
+        self.collect()
+        self.assertTrue(default_storage.exists(gone.image.name),
+                        'свежий файл мог ещё не попасть в БД')
+        self.collect(min_age=0)
+        for name in kept_files:
+            self.assertTrue(default_storage.exists(name), name)
+        for name in gone_files:
+            self.assertFalse(default_storage.exists(name), name)
+        self.assertIsNone(default.kvstore.get(gone_source))
+        self.assertIsNotNone(default.kvstore.get(ImageFile(kept.image)))
+
+    def test_shared_image_stays_while_referenced(self):
+        first = Post.objects.create(text='Первый', author=self.user,
+                                    image=self.image('shared.gif'))
+        Post.objects.create(text='Второй', author=self.user,
+                            image=first.image.name)
+        first.delete()
+        self.collect(min_age=0)
+        self.assertTrue(default_storage.exists(first.image.name))
+
+    def test_other_geometries_follow_their_source(self):
+        """миниатюры размеров вне THUMBNAIL_GEOMETRIES живут с оригиналом"""
+        backend = thumbnails.DeferredThumbnailBackend()
+        kept = Post.objects.create(text='Есть', author=self.user,
+                                   image=self.image('old_kept.gif'))
+        gone = Post.objects.create(text='Нет', author=self.user,
+                                   image=self.image('old_gone.gif'))
+        kept_thumb = backend.generate(kept.image, '50x50').name
+        gone_thumb = backend.generate(gone.image, '50x50').name
+        gone.delete()
+        self.collect(min_age=0)
+        self.assertTrue(default_storage.exists(kept_thumb))
+        self.assertFalse(default_storage.exists(gone_thumb))
@@ -8,7 +8,13 @@ import tempfile
 from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from io import BytesIO
+from unittest import mock
+from PIL import Image
+from posts import images
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+# Картинки хранятся под хешем содержимого.
+STORED_IMAGE = r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.(jpg|png|webp)$'
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -78,7 +84,7 @@ class PostFormTests(TestCase):
         self.assertTrue(
             Post.objects.filter(group=self.group,
                                 text='Тестовый текст',
-                                image=f'posts/{self.load}').exists())
+                                image__regex=STORED_IMAGE).exists())
 
     def test_edit_post(self):
         """проверка редакции"""
@@ -96,7 +102,7 @@ class PostFormTests(TestCase):
         self.assertTrue(Post.objects.filter(
                         text='Тестовый текст из формы для проверки',
                         group=self.group_v2_for_check.id,
-                        image=f'posts/{self.load_v2}').exists())
+                        image__regex=STORED_IMAGE).exists())
         self.assertFalse(Post.objects.filter(
                          text='Тестовый текст из формы',
                          group=self.group.id,
@@ -168,3 +174,59 @@ class CommentTest(TestCase):
                 self.assertEqual(info_v1, info_v2)
         # assertContains(response, text, ...) проверяет,
         # что в ответе сервера содержится указанный текст;
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImagePipelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='photographer')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def photo(self, size=(3000, 2000)):
+        buffer = BytesIO()
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera maker'
+        Image.new('RGB', size, (200, 30, 30)).save(
+            buffer, 'JPEG', exif=exif.tobytes())
+        return SimpleUploadedFile('photo.jpg', buffer.getvalue(),
+                                  content_type='image/jpeg')
+
+    def create(self, text, upload):
+        return self.authorized_client.post(
+            reverse('posts:post_create'), {'text': text, 'image': upload})
+
+    def test_upload_is_downsampled_without_metadata(self):
+        """большое фото уменьшается и теряет exif"""
+        self.create('Фото', self.photo())
+        post = Post.objects.get(text='Фото')
+        self.assertRegex(post.image.name, STORED_IMAGE)
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(max(stored.size), images.IMAGE_MAX_EDGE)
+            self.assertEqual(len(stored.getexif()), 0)
+
+    def test_identical_uploads_share_a_file(self):
+        self.create('Первое', self.photo((40, 30)))
+        self.create('Второе', self.photo((40, 30)))
+        first, second = (Post.objects.get(text=text).image.name
+                         for text in ('Первое', 'Второе'))
+        self.assertEqual(first, second)
+
+    @mock.patch.object(images, 'IMAGE_MAX_PIXELS', 100)
+    def test_oversized_image_rejected_by_header(self):
+        """слишком большие размеры отклоняются до декодирования"""
+        with mock.patch.object(images, '_encode') as encode:
+            response = self.create('Огромное', self.photo((40, 30)))
+        encode.assert_not_called()
+        self.assertFormError(response, 'form', 'image',
+                             'Картинка 40x30 слишком велика.')
+        self.assertFalse(Post.objects.filter(text='Огромное').exists())
@@ -1,6 +1,11 @@
-from ..models import Group, Post, Comment, Follow
+from ..models import AuthorStats, Group, GroupStats, Post, Comment, Follow
+from ..stats import rebuild_group_stats
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import Client, TestCase
+from django.urls import reverse
+from io import StringIO
 
 User = get_user_model()
 
@@ -48,3 +53,96 @@ class FollowModelTest(TestCase):
     def test_for_FollowModel_which_have_correact_objects(self):
         self.assertTrue(Follow.objects.get(author=self.author_for_check,
                                            user=self.user))
+
+
+class AuthorStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='gol43')
+        cls.reader = User.objects.create_user(username='fol43')
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def counters(self, user):
+        stats = AuthorStats.objects.get(user=user)
+        return [getattr(stats, name) for name in AuthorStats.COUNTERS]
+
+    def test_counters_follow_writes(self):
+        """счётчики меняются вместе с постами, комментами и подписками"""
+        post = Post.objects.create(text='Текст', author=self.author)
+        self.reader_client.post(
+            reverse('posts:add_comment', args=[post.pk]), {'text': 'Ок'})
+        self.reader_client.get(
+            reverse('posts:profile_follow', args=[self.author.username]))
+        self.assertEqual(self.counters(self.author), [1, 0, 1, 0])
+        self.assertEqual(self.counters(self.reader), [0, 1, 0, 1])
+        self.reader_client.get(
+            reverse('posts:profile_unfollow', args=[self.author.username]))
+        post.delete()
+        self.assertEqual(self.counters(self.author), [0, 0, 0, 0])
+        self.assertEqual(self.counters(self.reader), [0, 1, 0, 0])
+
+    def test_rebuild_command_fixes_drift(self):
+        """команда находит и исправляет расхождения"""
+        Post.objects.bulk_create(
+            Post(text='Текст', author=self.author) for _ in range(3))
+        with self.assertRaises(CommandError):
+            call_command('rebuild_author_stats', check=True,
+                         stdout=StringIO())
+        call_command('rebuild_author_stats', stdout=StringIO())
+        self.assertEqual(self.counters(self.author), [3, 0, 0, 0])
+        call_command('rebuild_author_stats', check=True, stdout=StringIO())
+
+
+class GroupStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='gol43')
+        cls.first = Group.objects.create(
+            title='Первая', slug='first', description='')
+        cls.second = Group.objects.create(
+            title='Вторая', slug='second', description='')
+
+    def setUp(self):
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def stats(self, group):
+        stats = GroupStats.objects.get(group=group)
+        return stats.posts_count, stats.last_post_at
+
+    def test_stats_follow_posts(self):
+        """счётчик и время последнего поста следуют за постами"""
+        self.assertEqual(self.stats(self.first), (0, None))
+        old = Post.objects.create(text='Старый', author=self.author,
+                                  group=self.first)
+        new = Post.objects.create(text='Новый', author=self.author,
+                                  group=self.first)
+        self.assertEqual(self.stats(self.first), (2, new.pub_date))
+        self.author_client.post(
+            reverse('posts:edit_post', args=[new.pk]),
+            {'text': 'Переехал', 'group': self.second.pk})
+        self.assertEqual(self.stats(self.first), (1, old.pub_date))
+        self.assertEqual(self.stats(self.second), (1, new.pub_date))
+        old.delete()
+        self.assertEqual(self.stats(self.first), (0, None))
+        expected = [self.stats(self.first), self.stats(self.second)]
+        rebuild_group_stats()
+        self.assertEqual(
+            [self.stats(self.first), self.stats(self.second)], expected)
+
+    def test_rebuild_command_fixes_drift(self):
+        """команда находит и исправляет расхождения"""
+        Post.objects.bulk_create(
+            Post(text='Текст', author=self.author, group=self.second)
+            for _ in range(3))
+        with self.assertRaises(CommandError):
+            call_command('rebuild_group_stats', check=True,
+                         stdout=StringIO())
+        call_command('rebuild_group_stats', stdout=StringIO())
+        self.assertEqual(self.stats(self.second)[0], 3)
+        call_command('rebuild_group_stats', check=True, stdout=StringIO())
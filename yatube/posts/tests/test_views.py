@@ -1,13 +1,25 @@
-from posts.models import Group, Post, User
+from posts.models import (AuthorStats, Comment, Follow, Group, Post,
+                          TimelineBackfill, TimelineEntry, User)
+from posts import syndication, thumbnails, timeline
+from posts.utils import NUMBERED_PAGES, PAGE_FOR_LIST, paginate
+from posts.views import COMMENTS_PER_PAGE
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from unittest import mock
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
 from django import forms
 from django.conf import settings
 import shutil
 import tempfile
-from django.core.cache import cache
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from io import StringIO
+from xml.etree import ElementTree
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
@@ -179,6 +191,56 @@ class PaginatorViewsTest(TestCase):
             args=[get_object_or_404(User, username='gol43')]) + '?page=2')
         self.assertEqual(len(response.context['page_obj']), 3)
 
+    def test_cursor_pages_cover_feed_without_gaps(self):
+        """курсоры вперёд и назад проходят ленту без пропусков"""
+        first = self.client.get(reverse('posts:index')).context['page_obj']
+        second = self.client.get(
+            reverse('posts:index') + f'?after={first.next_cursor}'
+        ).context['page_obj']
+        self.assertTrue(second.is_keyset)
+        self.assertFalse(second.has_next())
+        ids = [post.pk for post in first] + [post.pk for post in second]
+        self.assertEqual(
+            ids, list(Post.objects.order_by('-pub_date', '-pk')
+                      .values_list('pk', flat=True)))
+        back = self.client.get(
+            reverse('posts:index') + f'?before={second.previous_cursor}'
+        ).context['page_obj']
+        self.assertEqual([post.pk for post in back],
+                         [post.pk for post in first])
+        self.assertFalse(back.has_previous())
+
+    def test_last_page_and_broken_cursor(self):
+        """последняя страница и битый курсор"""
+        response = self.client.get(reverse('posts:index') + '?before=')
+        page_obj = response.context['page_obj']
+        oldest = Post.objects.order_by('pub_date', 'pk').first()
+        self.assertEqual(page_obj[9], oldest)
+        self.assertFalse(page_obj.has_next())
+        self.assertTrue(page_obj.has_previous())
+        response = self.client.get(reverse('posts:index') + '?after=@@@')
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+    def test_numbered_pages_are_bounded(self):
+        """номера только у первых страниц, и COUNT(*) идёт с LIMIT"""
+        request = RequestFactory().get('/', {'page': NUMBERED_PAGES})
+        with CaptureQueriesContext(connection) as queries:
+            page_obj = paginate(request, Post.objects.all(), 2)
+            list(page_obj)
+        self.assertIn('LIMIT', queries.captured_queries[0]['sql'])
+        self.assertTrue(page_obj.has_next())
+        self.assertEqual(list(page_obj.paginator.numbered_range),
+                         list(range(1, NUMBERED_PAGES + 1)))
+        response = self.client.get(
+            reverse('posts:index') + f'?page={NUMBERED_PAGES + 1}')
+        self.assertEqual(response.status_code, 404)
+
+    def test_cursor_page_runs_single_query(self):
+        """курсорная страница не делает COUNT(*)"""
+        request = RequestFactory().get('/', {'after': ''})
+        with self.assertNumQueries(1):
+            paginate(request, Post.objects.all(), 10)
+
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class ImageExsitsContext(TestCase):
@@ -235,3 +297,654 @@ class ImageExsitsContext(TestCase):
         image_for_detail = (
             additional_response_postdetail.context['post'].image.name)
         self.assertIn(self.post.image.name, image_for_detail)
+
+
+class FeedQueriesTest(TestCase):
+    """число запросов в лентах не зависит от числа постов"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        for i in range(PAGE_FOR_LIST):
+            author = User.objects.create_user(username=f'author{i}')
+            group = Group.objects.create(
+                title=f'Группа {i}', slug=f'group-{i}', description='')
+            Post.objects.create(text=f'Пост {i}', author=author, group=group)
+            Follow.objects.create(user=cls.reader, author=author)
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+        cache.clear()
+
+    def test_feed_pages_query_count(self):
+        post = Post.objects.first()
+        pages = {
+            reverse('posts:index'): 3,
+            reverse('posts:group_posts', args=[post.group.slug]): 4,
+            reverse('posts:profile', args=[post.author.username]): 5,
+        }
+        for url, queries in pages.items():
+            with self.subTest(url=url):
+                with self.assertNumQueries(queries):
+                    self.guest_client.get(url)
+
+    @override_settings(
+        SESSION_ENGINE='django.contrib.sessions.backends.cached_db',
+        AUTHENTICATION_BACKENDS=['users.backends.CachedModelBackend'])
+    def test_follow_index_query_count(self):
+        # Сессия должна ссылаться на кэширующий бэкенд.
+        self.authorized_client.force_login(self.reader)
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(len(response.context['page_obj']), PAGE_FOR_LIST)
+        # Сессия и пользователь берутся из кэша; плюс один запрос
+        # на готовые подсказки «кого почитать».
+        with self.assertNumQueries(4):
+            self.authorized_client.get(reverse('posts:follow_index'))
+
+    def test_feed_plans_use_indexes(self):
+        """запросы лент идут по составным индексам"""
+        call_command('check_feed_plans', stdout=StringIO())
+
+
+class FeedCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='gol43')
+        cls.group = Group.objects.create(
+            title='Первая', slug='first', description='')
+        cls.other_group = Group.objects.create(
+            title='Вторая', slug='second', description='')
+        Post.objects.create(text='Старый пост', author=cls.user,
+                            group=cls.group)
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def test_cached_page_skips_feed_queries(self):
+        """повторный показ ленты не читает посты из БД"""
+        self.guest_client.get(reverse('posts:index'))
+        # Остаётся только запрос новейшей даты для ETag.
+        with self.assertNumQueries(1):
+            response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Старый пост')
+
+    def test_post_save_invalidates_only_its_feeds(self):
+        """новый пост сбрасывает свои ленты и не трогает чужие"""
+        other_url = reverse('posts:group_posts', args=['second'])
+        self.guest_client.get(reverse('posts:index'))
+        self.guest_client.get(other_url)
+        Post.objects.create(text='Новый пост', author=self.user,
+                            group=self.group)
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Новый пост')
+        with self.assertNumQueries(2):
+            self.guest_client.get(other_url)
+
+    def test_group_change_invalidates_old_group(self):
+        """пост, перенесённый в другую группу, пропадает из старой"""
+        url = reverse('posts:group_posts', args=['first'])
+        self.guest_client.get(url)
+        post = Post.objects.get(text='Старый пост')
+        post.group = self.other_group
+        post.save()
+        response = self.guest_client.get(url)
+        self.assertNotContains(response, 'Старый пост')
+
+
+class FollowFeedTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.star = User.objects.create_user(username='star')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def feed_texts(self, query=''):
+        response = self.authorized_client.get(
+            reverse('posts:follow_index') + query)
+        return [post.text for post in response.context['page_obj']]
+
+    def test_timeline_follows_subscriptions(self):
+        """лента заполняется при подписке и чистится при отписке"""
+        Post.objects.create(text='До подписки', author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.create(text='После подписки', author=self.author)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 2)
+        self.assertEqual(self.feed_texts(), ['После подписки', 'До подписки'])
+        Follow.objects.filter(user=self.reader, author=self.author).delete()
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    @mock.patch.object(timeline, 'CELEBRITY_FOLLOWERS', 1)
+    def test_celebrity_posts_are_merged_on_read(self):
+        """посты «звёзд» не раскладываются, а подмешиваются при чтении"""
+        Follow.objects.create(user=self.author, author=self.star)
+        Follow.objects.create(user=self.reader, author=self.star)
+        for i in range(PAGE_FOR_LIST):
+            Post.objects.create(text=f'Звезда {i}', author=self.star)
+        self.assertFalse(TimelineEntry.objects.exists())
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.create(text='Автор', author=self.author)
+        self.assertEqual(TimelineEntry.objects.count(), 1)
+        first = self.authorized_client.get(
+            reverse('posts:follow_index')).context['page_obj']
+        self.assertEqual(first[0].text, 'Автор')
+        self.assertEqual(len(first), PAGE_FOR_LIST)
+        rest = self.feed_texts(f'?after={first.next_cursor}')
+        self.assertEqual(rest, ['Звезда 0'])
+
+    @mock.patch.object(timeline, 'CELEBRITY_FOLLOWERS', 2)
+    def test_demoted_celebrity_posts_stay_in_feed(self):
+        """после падения до порога посты «звезды» раскладываются по лентам"""
+        fans = [User.objects.create_user(username=f'fan{i}')
+                for i in range(2)]
+        for user in (self.reader, *fans):
+            Follow.objects.create(user=user, author=self.star)
+        Post.objects.create(text='Пока звезда', author=self.star)
+        # Подписка во время «звёздности» тоже не получила backfill.
+        Follow.objects.create(user=self.author, author=self.star)
+        self.assertFalse(TimelineEntry.objects.exists())
+        for fan in fans:
+            Follow.objects.filter(user=fan, author=self.star).delete()
+        # Отписка только ставит автора в очередь, посты подмешиваются.
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed_texts(), ['Пока звезда'])
+        call_command('backfill_timelines', '--batch-size=1',
+                     stdout=StringIO())
+        self.assertEqual(
+            set(TimelineEntry.objects.values_list('user_id', flat=True)),
+            {self.reader.pk, self.author.pk})
+        self.assertFalse(TimelineBackfill.objects.exists())
+        self.assertEqual(self.feed_texts(), ['Пока звезда'])
+
+
+class InlineExecutor:
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailPipelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='gol43')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        cache.clear()
+        self.uploaded = SimpleUploadedFile(
+            name='thumb.gif',
+            content=(b'\x47\x49\x46\x38\x39\x61\x02\x00'
+                     b'\x01\x00\x80\x00\x00\x00\x00\x00'
+                     b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+                     b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+                     b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+                     b'\x0A\x00\x3B'),
+            content_type='image/gif')
+
+    def test_request_gets_placeholder_and_queues_job(self):
+        """без готовой миниатюры страница отдаёт заглушку"""
+        Post.objects.create(text='Текст', author=self.user,
+                            image=self.uploaded)
+        with mock.patch.object(thumbnails.transaction, 'on_commit') as queue:
+            response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, thumbnails.PLACEHOLDER_URL)
+        self.assertEqual(queue.call_count, 1)
+
+    @mock.patch.object(thumbnails, 'close_old_connections')
+    @mock.patch.object(thumbnails, '_get_executor', InlineExecutor)
+    @mock.patch.object(thumbnails.transaction, 'on_commit',
+                       lambda callback: callback())
+    def test_create_pregenerates_all_geometries(self, close_connections):
+        """после создания поста готовы все размеры из шаблонов"""
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            {'text': 'С картинкой', 'image': self.uploaded})
+        post = Post.objects.get(text='С картинкой')
+        backend = thumbnails.DeferredThumbnailBackend()
+        for geometry, options in thumbnails.THUMBNAIL_GEOMETRIES:
+            with self.subTest(geometry=geometry):
+                thumbnail = backend.get_thumbnail(
+                    post.image, geometry, **options)
+                self.assertNotIsInstance(thumbnail, thumbnails.Placeholder)
+
+    @override_settings(THUMBNAIL_WORKERS=0)
+    def test_ready_thumbnail_replaces_cached_placeholder(self):
+        """без пула миниатюра режется сразу и сдвигает версии страниц"""
+        Post.objects.create(text='Текст', author=self.user,
+                            image=self.uploaded)
+        url = reverse('posts:profile', args=[self.user.username])
+        jobs = []
+        with mock.patch.object(thumbnails.transaction, 'on_commit',
+                               jobs.append):
+            first = self.authorized_client.get(url)
+        self.assertContains(first, thumbnails.PLACEHOLDER_URL)
+        for job in jobs:
+            job()
+        response = self.authorized_client.get(
+            url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, thumbnails.PLACEHOLDER_URL)
+
+    def test_thumbnail_cleanup_and_clear_commands(self):
+        """manage.py thumbnail cleanup и clear находят записи в кэше"""
+        backend = thumbnails.DeferredThumbnailBackend()
+        posts = []
+        for name in ('kept.gif', 'gone.gif'):
+            self.uploaded.seek(0)
+            self.uploaded.name = name
+            post = Post.objects.create(text=name, author=self.user,
+                                       image=self.uploaded)
+            for geometry, options in thumbnails.THUMBNAIL_GEOMETRIES:
+                backend.generate(post.image, geometry, **options)
+            posts.append(post)
+        kept, gone = (ImageFile(post.image) for post in posts)
+        default.storage.delete(gone.name)
+        call_command('thumbnail', 'cleanup', verbosity=0)
+        self.assertIsNotNone(default.kvstore.get(kept))
+        self.assertIsNone(default.kvstore.get(gone))
+        call_command('thumbnail', 'clear', verbosity=0)
+        self.assertIsNone(default.kvstore.get(kept))
+        self.assertEqual(list(default.kvstore._find_keys()), [])
+
+    def test_feed_reads_thumbnails_in_one_lookup(self):
+        """записи миниатюр всей страницы берутся одним get_many"""
+        backend = thumbnails.DeferredThumbnailBackend()
+        for i in range(3):
+            self.uploaded.seek(0)
+            self.uploaded.name = f'thumb{i}.gif'
+            post = Post.objects.create(text=f'Пост {i}', author=self.user,
+                                       image=self.uploaded)
+            for geometry, options in thumbnails.THUMBNAIL_GEOMETRIES:
+                backend.generate(post.image, geometry, **options)
+        store = caches['thumbnails']
+        lookup = store.get
+        # LocMemCache.get_many сам зовёт get: считаем только прямые get.
+        with mock.patch.object(store, 'get', side_effect=lookup) as get, \
+                mock.patch.object(store, 'get_many') as get_many:
+            get_many.side_effect = lambda keys: {
+                key: lookup(key) for key in keys}
+            response = self.authorized_client.get(reverse('posts:index'))
+        self.assertNotContains(response, thumbnails.PLACEHOLDER_URL)
+        self.assertEqual(get_many.call_count, 1)
+        self.assertEqual(get.call_count, 0)
+
+
+class SearchViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='gol43')
+        cls.group = Group.objects.create(
+            title='Велосипеды', slug='bikes', description='Про шоссе')
+        cls.post = Post.objects.create(
+            text='Катались весь день', author=cls.user, group=cls.group)
+        Post.objects.create(text='Пекли пироги', author=cls.user)
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def found(self, query):
+        response = self.guest_client.get(reverse('posts:search'),
+                                         {'q': query})
+        return [post.text for post in response.context['page_obj']]
+
+    def test_search_by_post_and_group_text(self):
+        """поиск по тексту поста, префиксу и описанию группы"""
+        self.assertEqual(self.found('катались'), ['Катались весь день'])
+        self.assertEqual(self.found('пирог'), ['Пекли пироги'])
+        self.assertEqual(self.found('шоссе'), ['Катались весь день'])
+        self.assertEqual(self.found('"OR* ('), [])
+        self.assertEqual(self.found(''), [])
+
+    def test_index_follows_edits(self):
+        """правка поста и группы сразу видна в поиске"""
+        self.post.text = 'Гуляли в парке'
+        self.post.save()
+        self.assertEqual(self.found('катались'), [])
+        self.group.description = 'Про горы'
+        self.group.save()
+        self.assertEqual(self.found('горы'), ['Гуляли в парке'])
+        self.group.delete()
+        self.assertEqual(self.found('горы'), [])
+        self.post.delete()
+        self.assertEqual(self.found('парке'), [])
+
+
+class CommentsPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='commentator')
+        cls.group = Group.objects.create(title='Споры', slug='debates')
+        cls.post = Post.objects.create(
+            text='Обсуждаем', author=cls.user, group=cls.group)
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.user, text=f'Комментарий {i}')
+            for i in range(COMMENTS_PER_PAGE + 5))
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def test_detail_shows_first_chunk(self):
+        """на странице поста только первая порция комментариев"""
+        response = self.guest_client.get(
+            reverse('posts:post_detail', args=[self.post.pk]))
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENTS_PER_PAGE)
+        self.assertTrue(comments.has_next())
+        self.assertContains(response, 'js-more-comments')
+
+    def test_fragment_returns_next_chunk(self):
+        """фрагмент по курсору отдаёт оставшиеся комментарии"""
+        response = self.guest_client.get(
+            reverse('posts:post_detail', args=[self.post.pk]))
+        cursor = response.context['comments'].next_cursor
+        response = self.guest_client.get(
+            reverse('posts:post_comments', args=[self.post.pk]),
+            {'after': cursor})
+        comments = response.context['comments']
+        self.assertEqual(len(comments), 5)
+        self.assertFalse(comments.has_next())
+        self.assertNotContains(response, 'js-more-comments')
+
+    def test_fragment_for_missing_post_is_404(self):
+        """фрагмент комментариев несуществующего поста — 404"""
+        response = self.guest_client.get(
+            reverse('posts:post_comments', args=[self.post.pk + 1]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_detail_queries_do_not_grow(self):
+        """число запросов не зависит от числа комментариев"""
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        self.guest_client.get(url)
+        with self.assertNumQueries(4) as queries:
+            self.guest_client.get(url)
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.user, text='Ещё')
+            for _ in range(50))
+        with self.assertNumQueries(len(queries.captured_queries)):
+            self.guest_client.get(url)
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='writer')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Заметки', slug='notes', description='')
+        cls.post = Post.objects.create(
+            text='Первая запись', author=cls.author, group=cls.group)
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        cache.clear()
+
+    def revalidate(self, client, url, response):
+        return client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag'],
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+
+    def test_unchanged_pages_answer_304(self):
+        """неизменная страница отдаёт 304 без рендера"""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_posts', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:post_detail', args=[self.post.pk]),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertIn('no-cache', response['Cache-Control'])
+                with self.assertTemplateNotUsed('base.html'):
+                    response = self.revalidate(
+                        self.guest_client, url, response)
+                self.assertEqual(response.status_code, 304)
+
+    def test_changes_break_validators(self):
+        """новый пост, правка, комментарий и правка группы — новая страница"""
+        url = reverse('posts:post_detail', args=[self.post.pk])
+
+        def rename_group():
+            self.group.title = 'Записки'
+            self.group.save()
+
+        changes = [
+            rename_group,
+            lambda: self.post.save(),
+            lambda: Comment.objects.create(
+                post=self.post, author=self.reader, text='Согласен'),
+            lambda: Post.objects.create(text='Ещё', author=self.author),
+        ]
+        for change in changes:
+            response = self.guest_client.get(url)
+            change()
+            response = self.revalidate(self.guest_client, url, response)
+            self.assertEqual(response.status_code, 200)
+
+    def test_viewer_variations(self):
+        """страница зависит от зрителя и его подписки"""
+        url = reverse('posts:profile', args=[self.author.username])
+        response = self.guest_client.get(url)
+        response = self.revalidate(self.reader_client, url, response)
+        self.assertEqual(response.status_code, 200)
+        self.reader_client.get(
+            reverse('posts:profile_follow', args=[self.author.username]))
+        response = self.revalidate(self.reader_client, url, response)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['following'])
+
+    def test_relogin_breaks_post_validators(self):
+        """после повторного входа форма комментария получает новый токен"""
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.reader)
+        response = client.get(url)
+        self.assertEqual(self.revalidate(client, url, response).status_code,
+                         304)
+        client.logout()
+        client.force_login(self.reader)
+        response = self.revalidate(client, url, response)
+        self.assertEqual(response.status_code, 200)
+        client.post(reverse('posts:add_comment', args=[self.post.pk]), {
+            'text': 'Согласен',
+            'csrfmiddlewaretoken': response.context['csrf_token'],
+        })
+        self.assertTrue(Comment.objects.filter(
+            post=self.post, author=self.reader).exists())
+
+    def test_missing_page_is_404(self):
+        response = self.guest_client.get(
+            reverse('posts:group_posts', args=['missing']),
+            HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 404)
+
+
+class GroupDirectoryTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create_user(username='gol43')
+        Group.objects.create(title='Пустая', slug='empty', description='')
+        cls.active = Group.objects.create(
+            title='Живая', slug='alive', description='')
+        Post.objects.create(text='Пост', author=author, group=cls.active)
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def test_directory_from_stats(self):
+        """каталог читает одну таблицу и ставит активные группы первыми"""
+        url = reverse('posts:groups')
+        with self.assertNumQueries(1):
+            response = self.guest_client.get(url)
+        titles = [stats.group.title for stats in response.context['groups']]
+        self.assertEqual(titles, ['Живая', 'Пустая'])
+        self.assertContains(response, 'Постов: 1')
+        with self.assertNumQueries(0):
+            self.guest_client.get(url)
+        Post.objects.create(text='Ещё', author=User.objects.get(),
+                            group=self.active)
+        self.assertContains(self.guest_client.get(url), 'Постов: 2')
+
+
+class FollowServiceTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.neighbour = User.objects.create_user(username='neighbour')
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+        Post.objects.create(text='Пост автора', author=cls.author)
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_follow_and_unfollow_are_idempotent(self):
+        """повторная подписка и отписка ничего не ломают"""
+        follow_url = reverse('posts:profile_follow', args=['author'])
+        unfollow_url = reverse('posts:profile_unfollow', args=['author'])
+        profile_url = reverse('posts:profile', args=['author'])
+        for _ in range(2):
+            self.assertRedirects(self.reader_client.get(follow_url),
+                                 profile_url)
+        self.assertEqual(Follow.objects.filter(user=self.reader).count(), 1)
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.author).followers_count, 1)
+        for _ in range(2):
+            self.assertRedirects(self.reader_client.get(unfollow_url),
+                                 profile_url)
+        self.assertFalse(Follow.objects.filter(user=self.reader).exists())
+        response = self.reader_client.get(
+            reverse('posts:profile_follow', args=['nobody']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_follow_list_import(self):
+        """подписка списком: счётчики и лента как у обычной подписки"""
+        Follow.objects.create(user=self.reader, author=self.other)
+        response = self.reader_client.post(
+            reverse('posts:follow_import'),
+            {'usernames': 'author other nobody reader'})
+        self.assertRedirects(response, reverse('posts:follow_index'))
+        self.assertEqual(
+            set(Follow.objects.filter(user=self.reader).values_list(
+                'author__username', flat=True)), {'author', 'other'})
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.reader).following_count, 2)
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.author).followers_count, 1)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, author=self.author).exists())
+
+    def test_suggestions_from_batch_job(self):
+        """подсказки берутся из пакетного расчёта по совместным подпискам"""
+        Follow.objects.create(user=self.reader, author=self.other)
+        Follow.objects.create(user=self.neighbour, author=self.other)
+        Follow.objects.create(user=self.neighbour, author=self.author)
+        url = reverse('posts:follow_index')
+        self.assertEqual(
+            list(self.reader_client.get(url).context['suggestions']), [])
+        call_command('compute_follow_suggestions', stdout=StringIO())
+        suggestions = self.reader_client.get(url).context['suggestions']
+        self.assertEqual(
+            [item.author.username for item in suggestions], ['author'])
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(
+            list(self.reader_client.get(url).context['suggestions']), [])
+
+
+class SyndicationFeedTest(TestCase):
+    ATOM = '{http://www.w3.org/2005/Atom}'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='gol43')
+        cls.other = User.objects.create_user(username='fol43')
+        cls.group = Group.objects.create(
+            title='Сады', slug='gardens', description='')
+        for i in range(syndication.FEED_ITEMS + 2):
+            Post.objects.create(text=f'Пост {i}', author=cls.author,
+                                group=cls.group)
+        Post.objects.create(text='Чужой пост', author=cls.other)
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def read(self, url, **params):
+        response = self.guest_client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, ElementTree.fromstring(
+            b''.join(response.streaming_content))
+
+    def test_rss_pages_by_cursor(self):
+        """RSS отдаётся страницами, ссылка next ведёт дальше"""
+        _, rss = self.read(reverse('posts:index_feed'))
+        items = rss.findall('channel/item')
+        self.assertEqual(len(items), syndication.FEED_ITEMS)
+        self.assertEqual(items[0].find('title').text, 'Чужой пост')
+        next_url = rss.find(f'channel/{self.ATOM}link[@rel="next"]')
+        _, rest = self.read(next_url.get('href'))
+        self.assertEqual(len(rest.findall('channel/item')), 3)
+        self.assertIsNone(rest.find(f'channel/{self.ATOM}link[@rel="next"]'))
+
+    def test_scoped_atom_feeds(self):
+        urls = {
+            reverse('posts:group_feed', args=[self.group.slug]): 'Пост',
+            reverse('posts:profile_feed', args=[self.other.username]):
+                'Чужой пост',
+        }
+        for url, text in urls.items():
+            with self.subTest(url=url):
+                response, atom = self.read(url, format='atom')
+                self.assertEqual(response['Content-Type'],
+                                 'application/atom+xml; charset=utf-8')
+                entries = atom.findall(f'{self.ATOM}entry')
+                self.assertTrue(entries)
+                for entry in entries:
+                    self.assertTrue(entry.find(
+                        f'{self.ATOM}summary').text.startswith(text))
+        response = self.guest_client.get(
+            reverse('posts:index_feed'), {'format': 'json'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_feed_is_cached_and_answers_304(self):
+        """повторный опрос не строит ленту, с ETag — 304 без тела"""
+        url = reverse('posts:index_feed')
+        response, _ = self.read(url)
+        with self.assertNumQueries(1):
+            cached = self.guest_client.get(url)
+        self.assertFalse(cached.streaming)
+        self.assertIn(b'<rss', cached.content)
+        with self.assertNumQueries(1):
+            response = self.guest_client.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        Post.objects.create(text='Новый', author=self.other)
+        _, rss = self.read(url)
+        self.assertEqual(rss.find('channel/item/title').text, 'Новый')
@@ -0,0 +1,262 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections, transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.helpers import deserialize
+from sorl.thumbnail.images import DummyImageFile, ImageFile
+from sorl.thumbnail.kvstores.base import KVStoreBase, add_prefix
+
+from .caching import (INDEX_FEED, bump_feeds, group_feed, post_feed,
+                      profile_feed)
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Все размеры, которые запрашивают шаблоны; их готовим сразу после загрузки.
+THUMBNAIL_GEOMETRIES = (
+    ('1080x444', {'crop': 'center', 'upscale': True}),
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+PLACEHOLDER_URL = ('data:image/gif;base64,'
+                   'R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7')
+# Столько картинок постов проверяется одним get_many при поиске ключей.
+KEYS_BATCH_SIZE = 500
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+class Placeholder(DummyImageFile):
+    """Прозрачная заглушка нужного размера, пока миниатюра готовится."""
+
+    @property
+    def url(self):
+        return PLACEHOLDER_URL
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'THUMBNAIL_WORKERS', 2),
+                thread_name_prefix='thumbnails')
+        return _executor
+
+
+def _refresh_feeds(name):
+    """Сдвигает версии страниц, где вместо картинки стояла заглушка.
+
+    Иначе фрагмент ленты и ETag страницы так и останутся с заглушкой
+    до следующей правки. Одна картинка может быть у нескольких постов.
+    """
+    feeds = set()
+    rows = Post.objects.filter(image=name).values_list(
+        'pk', 'author_id', 'group_id')
+    for post_id, author_id, group_id in rows:
+        feeds.update((INDEX_FEED, post_feed(post_id),
+                      profile_feed(author_id)))
+        if group_id is not None:
+            feeds.add(group_feed(group_id))
+    bump_feeds(*feeds)
+
+
+def _generate(name, geometry, options):
+    try:
+        DeferredThumbnailBackend().generate(name, geometry, **options)
+        _refresh_feeds(name)
+    except Exception:
+        logger.exception('Не удалось подготовить миниатюру %s %s',
+                         name, geometry)
+    finally:
+        with _lock:
+            _pending.discard((name, geometry))
+
+
+def _generate_in_pool(name, geometry, options):
+    try:
+        _generate(name, geometry, options)
+    finally:
+        close_old_connections()
+
+
+def _submit(name, geometry, options):
+    with _lock:
+        if (name, geometry) in _pending:
+            return
+        _pending.add((name, geometry))
+    if getattr(settings, 'THUMBNAIL_WORKERS', 2):
+        _get_executor().submit(_generate_in_pool, name, geometry, options)
+    else:
+        _generate(name, geometry, options)
+
+
+def schedule(name, geometry, options):
+    """Ставит миниатюру в очередь пула; повторные просьбы схлопываются.
+
+    Задача уходит в пул только после фиксации транзакции: воркер
+    должен видеть уже сохранённый пост и файл. При THUMBNAIL_WORKERS = 0
+    пула нет, и миниатюра режется в том же потоке после фиксации.
+    """
+    options = dict(options)
+    transaction.on_commit(lambda: _submit(name, geometry, options))
+
+
+def pregenerate(image):
+    """Готовит все размеры из THUMBNAIL_GEOMETRIES для загруженной картинки."""
+    if image:
+        for geometry, options in THUMBNAIL_GEOMETRIES:
+            schedule(image.name, geometry, options)
+
+
+class DeferredThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl, который в запросе только читает готовые миниатюры.
+
+    Если миниатюры ещё нет в хранилище ключей, шаблон получает
+    Placeholder, а сама нарезка уходит в пул потоков.
+    """
+
+    def _options(self, source, options):
+        # Те же значения по умолчанию, что в ThumbnailBackend.get_thumbnail,
+        # иначе имя файла миниатюры не совпадёт.
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        return options
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if not file_:
+            raise ValueError('falsey file_ argument in get_thumbnail()')
+        source = ImageFile(file_)
+        name = self._get_thumbnail_filename(
+            source, geometry_string, self._options(source, dict(options)))
+        cached = default.kvstore.get(ImageFile(name, default.storage))
+        if cached:
+            return cached
+        schedule(source.name, geometry_string, options)
+        return Placeholder(geometry_string)
+
+    def generate(self, file_, geometry_string, **options):
+        return super().get_thumbnail(file_, geometry_string, **options)
+
+
+def thumbnail_names(name):
+    """Имена файлов всех размеров из THUMBNAIL_GEOMETRIES для картинки.
+
+    Считаются по ключу sorl без чтения файла и хранилища ключей.
+    """
+    backend = DeferredThumbnailBackend()
+    source = ImageFile(name, default.storage)
+    for geometry, options in THUMBNAIL_GEOMETRIES:
+        yield backend._get_thumbnail_filename(
+            source, geometry, backend._options(source, dict(options)))
+
+
+class CacheKVStore(KVStoreBase):
+    """Хранилище ключей sorl целиком в кэше THUMBNAIL_CACHE, без БД.
+
+    Потерянная запись не страшна: бэкенд восстановит её по уже
+    нарезанному файлу. Внутри prefetched() записи берутся из словаря,
+    заполненного одним get_many. Кэш не умеет перечислять ключи,
+    поэтому cleanup и clear из manage.py thumbnail обходят картинки
+    постов (см. _find_keys_raw).
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    @property
+    def cache(self):
+        return caches[sorl_settings.THUMBNAIL_CACHE]
+
+    @property
+    def _prefetched(self):
+        return getattr(self._local, 'values', None)
+
+    @contextmanager
+    def prefetched(self, keys):
+        values = dict.fromkeys(keys)
+        # Промахи тоже запоминаются: второй раз в кэш за ними не ходим.
+        values.update(self.cache.get_many(keys))
+        outer, self._local.values = self._prefetched, values
+        try:
+            yield
+        finally:
+            self._local.values = outer
+
+    def _forget(self, keys):
+        if self._prefetched is not None:
+            for key in keys:
+                self._prefetched.pop(key, None)
+
+    def _get_raw(self, key):
+        if self._prefetched is not None and key in self._prefetched:
+            return self._prefetched[key]
+        return self.cache.get(key)
+
+    def _set_raw(self, key, value):
+        self.cache.set(key, value, None)
+        self._forget([key])
+
+    def _delete_raw(self, *keys):
+        self.cache.delete_many(keys)
+        self._forget(keys)
+
+    def _find_keys_raw(self, prefix):
+        """Существующие ключи картинок постов и их миниатюр.
+
+        Записи картинок, на которые не ссылается ни один пост, так
+        не найти; их вместе с файлами убирает collect_media_garbage.
+        """
+        names = Post.objects.exclude(image='').order_by().values_list(
+            'image', flat=True).distinct().iterator()
+        while True:
+            batch = list(islice(names, KEYS_BATCH_SIZE))
+            if not batch:
+                return
+            yield from (key for key in self._existing_keys(batch)
+                        if key.startswith(prefix))
+
+    def _existing_keys(self, names):
+        keys, lists = [], []
+        for name in names:
+            source = ImageFile(name, default.storage).key
+            lists.append(add_prefix(source, 'thumbnails'))
+            keys += [add_prefix(source), lists[-1]]
+            keys += [add_prefix(ImageFile(thumbnail, default.storage).key)
+                     for thumbnail in thumbnail_names(name)]
+        found = self.cache.get_many(keys)
+        # Размеры не из THUMBNAIL_GEOMETRIES известны только по спискам.
+        listed = {add_prefix(key) for list_key in lists if list_key in found
+                  for key in deserialize(found[list_key])}
+        found.update(self.cache.get_many(listed - found.keys()))
+        return list(found)
+
+
+@contextmanager
+def prefetch(posts):
+    """Записи всех миниатюр постов страницы одним запросом к кэшу."""
+    kvstore = default.kvstore
+    if not isinstance(kvstore, CacheKVStore):
+        yield
+        return
+    keys = [add_prefix(ImageFile(name, default.storage).key)
+            for post in posts if post.image
+            for name in thumbnail_names(post.image.name)]
+    with kvstore.prefetched(keys):
+        yield
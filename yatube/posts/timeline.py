@@ -0,0 +1,216 @@
+from functools import partial
+from heapq import merge
+from operator import attrgetter, itemgetter
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import (FEED_FIELDS, AuthorStats, Follow, Post, TimelineBackfill,
+                     TimelineEntry)
+from .utils import bulk_create_in_chunks, seek_filter
+
+CELEBRITY_FOLLOWERS = 10000
+TIMELINE_BATCH_SIZE = 1000
+BACKFILL_FOLLOWERS_BATCH = 100
+
+
+def celebrities(author_ids):
+    """Те из авторов, чьи посты не раскладываются по лентам."""
+    return set(AuthorStats.objects.filter(
+        user_id__in=author_ids,
+        followers_count__gt=CELEBRITY_FOLLOWERS,
+    ).values_list('user_id', flat=True))
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    fan_out_many([post])
+
+
+def fan_out_many(posts):
+    """fan_out для пачки постов: подписчики всех авторов одним запросом."""
+    authors = {post.author_id for post in posts} - celebrities(
+        {post.author_id for post in posts})
+    if not authors:
+        return
+    followers = {}
+    rows = Follow.objects.filter(author_id__in=authors).values_list(
+        'author_id', 'user_id').iterator()
+    for author_id, user_id in rows:
+        followers.setdefault(author_id, []).append(user_id)
+    bulk_create_in_chunks(
+        TimelineEntry,
+        (TimelineEntry(user_id=user_id, post_id=post.pk,
+                       author_id=post.author_id, pub_date=post.pub_date)
+         for post in posts
+         for user_id in followers.get(post.author_id, ())),
+        TIMELINE_BATCH_SIZE, ignore_conflicts=True)
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика все посты нового автора."""
+    backfill_many([(user_id, author_id)])
+
+
+def backfill_many(pairs):
+    """backfill для пачки подписок (user_id, author_id) одним проходом."""
+    followers = {}
+    for user_id, author_id in pairs:
+        followers.setdefault(author_id, []).append(user_id)
+    authors = followers.keys() - celebrities(followers)
+    if not authors:
+        return
+    posts = Post.objects.filter(author_id__in=authors).order_by().values_list(
+        'author_id', 'pk', 'pub_date').iterator()
+    bulk_create_in_chunks(
+        TimelineEntry,
+        (TimelineEntry(user_id=user_id, post_id=post_id,
+                       author_id=author_id, pub_date=pub_date)
+         for author_id, post_id, pub_date in posts
+         for user_id in followers[author_id]),
+        TIMELINE_BATCH_SIZE, ignore_conflicts=True)
+
+
+def demote_if_crossed(author_id):
+    """Ставит в очередь автора, который только что перестал быть «звездой».
+
+    Вызывается после отписки. Пока подписчиков было больше
+    CELEBRITY_FOLLOWERS, посты автора и новые подписки на него в
+    TimelineEntry не попадали. Ровно на пороге ленты надо дополнить,
+    но это тысячи подписчиков, поэтому их раскладывает
+    backfill_demoted вне запроса, а до тех пор FollowFeed подмешивает
+    посты автора при чтении.
+    """
+    if AuthorStats.objects.filter(
+            user_id=author_id,
+            followers_count=CELEBRITY_FOLLOWERS).exists():
+        TimelineBackfill.objects.get_or_create(author_id=author_id)
+
+
+def backfill_demoted(batch_size=BACKFILL_FOLLOWERS_BATCH, progress=None):
+    """Раскладывает посты авторов из очереди TimelineBackfill.
+
+    Подписчики идут пачками по возрастанию id, каждая пачка — в
+    отдельной транзакции. Автор уходит из очереди, когда разложен.
+    """
+    done = 0
+    queued = TimelineBackfill.objects.order_by('queued_at').values_list(
+        'author_id', flat=True)
+    for author_id in list(queued):
+        followers = Follow.objects.filter(author_id=author_id).order_by(
+            'user_id').values_list('user_id', flat=True)
+        last = 0
+        while True:
+            batch = list(followers.filter(user_id__gt=last)[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                backfill_many((user_id, author_id) for user_id in batch)
+            last = batch[-1]
+        TimelineBackfill.objects.filter(author_id=author_id).delete()
+        done += 1
+        if progress is not None:
+            progress(done)
+    return done
+
+
+def trim(user_id, author_id):
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def _renamed(lookups, row):
+    return {lookups[lookup]: value for lookup, value in row.items()}
+
+
+class FollowFeed:
+    """Лента подписок: готовая лента из TimelineEntry плюс посты «звёзд».
+
+    Материализованная часть читается одним проходом по индексу
+    (user, -pub_date, -post). Посты авторов, у которых больше
+    CELEBRITY_FOLLOWERS подписчиков, не раскладываются по лентам и
+    подмешиваются при чтении, как и посты авторов в очереди
+    TimelineBackfill. Объект понимает ровно те операции, которые
+    нужны KeysetPaginator, и отдаёт посты в порядке (pub_date, id).
+    """
+
+    def __init__(self, user, ordering=('-pub_date', '-pk'), sources=None,
+                 getter=attrgetter):
+        self.user = user
+        self.ordering = ordering
+        if sources is None:
+            sources = self._sources(user)
+        self.sources = sources
+        self.getter = getter
+
+    @staticmethod
+    def _sources(user):
+        celebrities = list(Follow.objects.filter(
+            Q(author__stats__followers_count__gt=CELEBRITY_FOLLOWERS)
+            | Q(author__timeline_backfill__isnull=False),
+            user=user,
+        ).values_list('author_id', flat=True))
+        entries = (
+            TimelineEntry.objects.filter(user=user)
+            .exclude(author_id__in=celebrities)
+            .select_related('post__author', 'post__group')
+            .only('pub_date', 'post',
+                  *(f'post__{field}' for field in FEED_FIELDS)))
+        sources = [(entries, 'post_id', attrgetter('post'))]
+        if celebrities:
+            posts = Post.objects.feed().filter(author_id__in=celebrities)
+            sources.append((posts, 'pk', None))
+        return sources
+
+    def _clone(self, ordering=None, sources=None, getter=None):
+        return FollowFeed(self.user, ordering or self.ordering,
+                          sources or self.sources, getter or self.getter)
+
+    def values(self, *fields):
+        """Та же лента словарями с полями поста, без создания моделей."""
+        sources = []
+        for queryset, tiebreak, convert in self.sources:
+            if convert is None:
+                sources.append((queryset.values(*fields), tiebreak, None))
+                continue
+            # Ключ ленты берётся из самой записи TimelineEntry.
+            own = {'pk': tiebreak, 'pub_date': 'pub_date'}
+            lookups = {own.get(field, f'post__{field}'): field
+                       for field in fields}
+            sources.append((queryset.values(*lookups), tiebreak,
+                            partial(_renamed, lookups)))
+        return self._clone(sources=sources, getter=itemgetter)
+
+    def _ordered(self):
+        for queryset, tiebreak, convert in self.sources:
+            ordering = [field.replace('pk', tiebreak)
+                        for field in self.ordering]
+            yield queryset.order_by(*ordering), convert
+
+    def order_by(self, *ordering):
+        return self._clone(ordering=ordering)
+
+    def reverse(self):
+        return self._clone(ordering=[
+            field[1:] if field.startswith('-') else f'-{field}'
+            for field in self.ordering])
+
+    def seek(self, key, cursor, lookup):
+        return self._clone(sources=[
+            (queryset.filter(seek_filter(key, tiebreak, cursor, lookup)),
+             tiebreak, convert)
+            for queryset, tiebreak, convert in self.sources])
+
+    def count(self):
+        return sum(queryset.count() for queryset, _, _ in self.sources)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice) or index.stop is None:
+            raise TypeError('FollowFeed поддерживает только срезы [a:b].')
+        streams = []
+        for queryset, convert in self._ordered():
+            rows = queryset[:index.stop]
+            streams.append(map(convert, rows) if convert else rows)
+        key = self.ordering[0].lstrip('-')
+        posts = merge(*streams, key=self.getter(key, 'pk'),
+                      reverse=self.ordering[0].startswith('-'))
+        return list(posts)[index]
@@ -0,0 +1,296 @@
+import csv
+import json
+import os
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .caching import (GROUPS_FEED, INDEX_FEED, bump_feeds, group_feed,
+                      post_feed, profile_feed)
+from .models import Comment, Follow, Group, Post, User
+from .search import index_posts
+from .stats import rebuild_group_stats, rebuild_stats
+from .timeline import backfill_many, fan_out_many
+
+FORMATS = ('ndjson', 'csv')
+TRANSFER_BATCH_SIZE = 500
+# Три параметра на строку в UPDATE ... CASE: старые SQLite держат 999.
+DATES_CHUNK = 300
+
+# Колонка файла -> поле для values_list. Связи выгружаются естественными
+# ключами (username, slug), посты и комментарии — со своими id.
+COLUMNS = {
+    'groups': {
+        'slug': 'slug',
+        'title': 'title',
+        'description': 'description'},
+    'posts': {
+        'id': 'pk',
+        'author': 'author__username',
+        'group': 'group__slug',
+        'pub_date': 'pub_date',
+        'text': 'text',
+        'image': 'image'},
+    'comments': {
+        'id': 'pk',
+        'post': 'post_id',
+        'author': 'author__username',
+        'created': 'created',
+        'text': 'text'},
+    'follows': {
+        'user': 'user__username',
+        'author': 'author__username'},
+}
+MODELS = {
+    'groups': Group,
+    'posts': Post,
+    'comments': Comment,
+    'follows': Follow,
+}
+
+
+def guess_format(path):
+    return 'csv' if path.endswith('.csv') else 'ndjson'
+
+
+def _plain(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def export_rows(kind, batch_size=TRANSFER_BATCH_SIZE):
+    """Строки таблицы по порядку id, серверным курсором, без моделей."""
+    columns = COLUMNS[kind]
+    rows = MODELS[kind].objects.order_by('pk').values_list(
+        *columns.values()).iterator(chunk_size=batch_size)
+    for row in rows:
+        yield dict(zip(columns, map(_plain, row)))
+
+
+def write_rows(rows, stream, fmt, columns):
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=list(columns))
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            yield row
+        return
+    for row in rows:
+        stream.write(json.dumps(row, ensure_ascii=False) + '\n')
+        yield row
+
+
+def read_rows(stream, fmt):
+    if fmt == 'csv':
+        for row in csv.DictReader(stream):
+            # В CSV нет null: пустая строка значит «нет значения».
+            yield {key: value or None for key, value in row.items()}
+        return
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def _datetime(value):
+    if not value:
+        return timezone.now()
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(f'Не разобрать дату {value!r}')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, timezone.utc)
+    return parsed
+
+
+def restore_dates(model, field, dates):
+    """Возвращает строкам даты из файла: dates — {pk: дата}.
+
+    bulk_create ставит полям с auto_now_add текущее время. Флаг поля
+    общий для всего процесса, поэтому его не трогаем, а исправляем
+    вставленные строки одним UPDATE ... CASE на DATES_CHUNK строк.
+    """
+    pks = sorted(dates)
+    for start in range(0, len(pks), DATES_CHUNK):
+        chunk = pks[start:start + DATES_CHUNK]
+        model.objects.filter(pk__in=chunk).update(**{field: Case(
+            *(When(pk=pk, then=Value(dates[pk], DateTimeField()))
+              for pk in chunk),
+            output_field=DateTimeField())})
+
+
+class Importer:
+    """Загружает строки пачками; каждая пачка — своя транзакция.
+
+    Уже загруженные строки (по id, slug или паре подписки) пропускаются,
+    поэтому прерванный импорт можно просто запустить ещё раз. Сигналы
+    bulk_create не вызывает: ленты, поиск и кэш обновляются здесь же,
+    счётчики авторов и групп пересчитываются один раз в конце.
+    """
+
+    def __init__(self, kind, images=None, batch_size=TRANSFER_BATCH_SIZE):
+        self.load = getattr(self, f'_load_{kind}')
+        self.model = MODELS[kind]
+        self.images = images
+        self.batch_size = batch_size
+        self.feeds = set()
+        self.read = self.created = 0
+
+    def run(self, rows, progress=None):
+        """Возвращает (прочитано строк, добавлено строк)."""
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, self.batch_size))
+            if not chunk:
+                break
+            with transaction.atomic():
+                self.created += self.load(chunk)
+            self.read += len(chunk)
+            if progress is not None:
+                progress(self.read, self.created)
+        if self.created:
+            self._finish()
+        return self.read, self.created
+
+    def _finish(self):
+        if self.model in (Post, Comment):
+            # Id пришли из файла: последовательности PostgreSQL отстали.
+            sql = connection.ops.sequence_reset_sql(no_style(), [self.model])
+            with connection.cursor() as cursor:
+                for statement in sql:
+                    cursor.execute(statement)
+        if self.model in (Post, Comment, Follow):
+            rebuild_stats(batch_size=self.batch_size)
+        if self.model in (Group, Post):
+            rebuild_group_stats(batch_size=self.batch_size)
+            self.feeds.add(GROUPS_FEED)
+        bump_feeds(*self.feeds)
+
+    def _users(self, usernames):
+        """{username: id}; недостающие пользователи создаются без пароля."""
+        usernames = set(usernames)
+        users = dict(User.objects.filter(
+            username__in=usernames).values_list('username', 'pk'))
+        missing = usernames - users.keys()
+        if missing:
+            User.objects.bulk_create(
+                User(username=name, password=make_password(None))
+                for name in missing)
+            users.update(User.objects.filter(
+                username__in=missing).values_list('username', 'pk'))
+        return users
+
+    def _groups(self, slugs):
+        slugs = set(slugs)
+        groups = {group.slug: group for group in Group.objects.filter(
+            slug__in=slugs).only('slug', 'title', 'description')}
+        missing = slugs - groups.keys()
+        if missing:
+            raise ValueError(
+                'Неизвестные группы: ' + ', '.join(sorted(missing)))
+        return groups
+
+    def _image(self, name):
+        """Копирует картинку из каталога images в хранилище медиа."""
+        if not name or self.images is None:
+            return name or ''
+        if default_storage.exists(name):
+            return name
+        for source in (os.path.join(self.images, name),
+                       os.path.join(self.images, os.path.basename(name))):
+            if os.path.isfile(source):
+                with open(source, 'rb') as image:
+                    return default_storage.save(name, File(image))
+        raise ValueError(f'Нет файла картинки {name!r} в {self.images}')
+
+    def _new(self, chunk, key, existing):
+        """Строки пачки, которых ещё нет в БД, без повторов внутри пачки."""
+        rows = {}
+        for row in chunk:
+            if key(row) not in existing:
+                rows.setdefault(key(row), row)
+        return list(rows.values())
+
+    def _load_groups(self, chunk):
+        existing = set(Group.objects.filter(
+            slug__in=[row['slug'] for row in chunk]).values_list(
+            'slug', flat=True))
+        rows = self._new(chunk, lambda row: row['slug'], existing)
+        Group.objects.bulk_create(
+            Group(slug=row['slug'], title=row['title'],
+                  description=row['description'] or '')
+            for row in rows)
+        return len(rows)
+
+    def _load_posts(self, chunk):
+        existing = set(Post.objects.filter(
+            pk__in=[int(row['id']) for row in chunk]).values_list(
+            'pk', flat=True))
+        rows = self._new(chunk, lambda row: int(row['id']), existing)
+        if not rows:
+            return 0
+        users = self._users(row['author'] for row in rows)
+        groups = self._groups(row['group'] for row in rows if row['group'])
+        posts = [
+            Post(pk=int(row['id']), author_id=users[row['author']],
+                 group=groups.get(row['group']),
+                 pub_date=_datetime(row['pub_date']),
+                 text=row['text'], image=self._image(row['image']))
+            for row in rows]
+        dates = {post.pk: post.pub_date for post in posts}
+        Post.objects.bulk_create(posts)
+        restore_dates(Post, 'pub_date', dates)
+        for post in posts:
+            post.pub_date = dates[post.pk]
+        index_posts(posts)
+        fan_out_many(posts)
+        self.feeds.add(INDEX_FEED)
+        for post in posts:
+            self.feeds.add(profile_feed(post.author_id))
+            if post.group_id is not None:
+                self.feeds.add(group_feed(post.group_id))
+        return len(posts)
+
+    def _load_comments(self, chunk):
+        existing = set(Comment.objects.filter(
+            pk__in=[int(row['id']) for row in chunk]).values_list(
+            'pk', flat=True))
+        rows = self._new(chunk, lambda row: int(row['id']), existing)
+        if not rows:
+            return 0
+        post_ids = {int(row['post']) for row in rows if row['post']}
+        missing = post_ids - set(Post.objects.filter(
+            pk__in=post_ids).values_list('pk', flat=True))
+        if missing:
+            raise ValueError(
+                'Неизвестные посты: ' + ', '.join(map(str, sorted(missing))))
+        users = self._users(row['author'] for row in rows)
+        dates = {int(row['id']): _datetime(row['created']) for row in rows}
+        Comment.objects.bulk_create(
+            Comment(pk=int(row['id']),
+                    post_id=int(row['post']) if row['post'] else None,
+                    author_id=users[row['author']], text=row['text'])
+            for row in rows)
+        restore_dates(Comment, 'created', dates)
+        self.feeds.update(post_feed(post_id) for post_id in post_ids)
+        return len(rows)
+
+    def _load_follows(self, chunk):
+        users = self._users(
+            name for row in chunk for name in (row['user'], row['author']))
+        pairs = {(users[row['user']], users[row['author']]) for row in chunk}
+        existing = set(Follow.objects.filter(
+            user_id__in={user_id for user_id, _ in pairs},
+            author_id__in={author_id for _, author_id in pairs},
+        ).values_list('user_id', 'author_id'))
+        pairs = sorted(pairs - existing)
+        Follow.objects.bulk_create(
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id, author_id in pairs)
+        backfill_many(pairs)
+        return len(pairs)
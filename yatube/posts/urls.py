@@ -5,20 +5,34 @@ app_name = 'posts'
 urlpatterns = [
     path('', views.index,
          name='index'),
+    path('feed/', views.index_feed,
+         name='index_feed'),
+    path('groups/', views.groups,
+         name='groups'),
     path('group/<slug:slug>/', views.group_posts,
          name='group_posts'),
+    path('group/<slug:slug>/feed/', views.group_posts_feed,
+         name='group_feed'),
     path('profile/<str:username>/', views.profile,
          name='profile'),
+    path('profile/<str:username>/feed/', views.profile_posts_feed,
+         name='profile_feed'),
     path('posts/<int:post_id>/', views.post_detail,
          name='post_detail'),
+    path('search/', views.search,
+         name='search'),
     path('create/', views.post_create,
          name='post_create'),
     path('posts/<int:post_id>/edit/', views.edit_post,
          name='edit_post'),
+    path('posts/<int:post_id>/comments/', views.post_comments,
+         name='post_comments'),
     path('posts/<int:post_id>/comment/', views.add_comment,
          name='add_comment'),
     path('follow/', views.follow_index,
          name='follow_index'),
+    path('follow/import/', views.follow_import,
+         name='follow_import'),
     path('profile/<str:username>/follow/', views.profile_follow,
          name='profile_follow'),
     path('profile/<str:username>/unfollow/', views.profile_unfollow,
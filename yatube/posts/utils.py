@@ -1,10 +1,188 @@
-from django.core.paginator import Paginator
+import binascii
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from itertools import islice
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.http import Http404
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import SimpleLazyObject, cached_property
 
 PAGE_FOR_LIST = 10
+NUMBERED_PAGES = 5
+
+
+def encode_cursor(value, pk):
+    """Упаковывает пару (значение ключа, id) в непрозрачный курсор."""
+    raw = f'{value.isoformat()}|{pk}'.encode()
+    return urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Возвращает (значение ключа, id) или None для битого курсора."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        value, pk = urlsafe_b64decode(padded).decode().split('|')
+        value = parse_datetime(value)
+        pk = int(pk)
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        return None
+    if value is None:
+        return None
+    return value, pk
+
+
+def seek_filter(key, tiebreak, cursor, lookup):
+    """Условие «строго после курсора» для ключа (key, tiebreak)."""
+    value, pk = cursor
+    # Избыточное key <= value (>=) даёт планировщику диапазон по индексу,
+    # без него OR заставляет сканировать индекс с самого начала.
+    return Q(**{f'{key}__{lookup}e': value}) & (
+        Q(**{f'{key}__{lookup}': value})
+        | Q(**{key: value, f'{tiebreak}__{lookup}': pk}))
+
+
+class KeysetPage(Page):
+    """Страница, которая не знает своего номера и общего числа страниц."""
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        super().__init__(object_list, None, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<KeysetPage of {len(self.object_list)} objects>'
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    is_keyset = True
+
+
+class KeysetPaginator(Paginator):
+    """Пагинатор по ключу (key, id): любая страница за один запрос.
+
+    Первые NUMBERED_PAGES страниц по-прежнему доступны по номеру,
+    дальше навигация идёт только курсорами, без COUNT(*) и OFFSET.
+    Для номеров строки считаются лишь до конца NUMBERED_PAGES-й
+    страницы плюс одна: этого хватает, чтобы знать, есть ли следующая.
+    """
 
+    def __init__(self, object_list, per_page, key='pub_date',
+                 descending=True, **kwargs):
+        self.key = key
+        self.descending = descending
+        ordering = (key, 'pk')
+        if descending:
+            ordering = tuple(f'-{field}' for field in ordering)
+        super().__init__(object_list.order_by(*ordering), per_page, **kwargs)
 
-def paginate(request, object_list, post_per_page):
-    paginator = Paginator(object_list, post_per_page)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    @cached_property
+    def count(self):
+        head = self.object_list[:NUMBERED_PAGES * self.per_page + 1]
+        # Срез FollowFeed уже список, у QuerySet это COUNT(*) с LIMIT.
+        return len(head) if isinstance(head, list) else head.count()
+
+    @property
+    def numbered_range(self):
+        return range(1, min(self.num_pages, NUMBERED_PAGES) + 1)
+
+    def cursor_for(self, obj):
+        if isinstance(obj, dict):
+            # Строка из .values(): ключ и 'pk' должны быть среди полей.
+            return encode_cursor(obj[self.key], obj['pk'])
+        return encode_cursor(getattr(obj, self.key), obj.pk)
+
+    def _seek(self, queryset, cursor, forward):
+        """Строки строго после/до курсора в порядке ленты."""
+        lookup = 'lt' if forward == self.descending else 'gt'
+        if hasattr(queryset, 'seek'):
+            return queryset.seek(self.key, cursor, lookup)
+        return queryset.filter(seek_filter(self.key, 'pk', cursor, lookup))
+
+    def page_after(self, cursor):
+        queryset = self.object_list
+        decoded = decode_cursor(cursor)
+        if decoded is not None:
+            queryset = self._seek(queryset, decoded, forward=True)
+        rows = list(queryset[:self.per_page + 1])
+        return KeysetPage(rows[:self.per_page], self,
+                          has_next=len(rows) > self.per_page,
+                          has_previous=decoded is not None)
+
+    def page_before(self, cursor):
+        queryset = self.object_list.reverse()
+        decoded = decode_cursor(cursor) if cursor else None
+        if decoded is not None:
+            queryset = self._seek(queryset, decoded, forward=False)
+        rows = list(queryset[:self.per_page + 1])
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        rows.reverse()
+        return KeysetPage(rows, self,
+                          has_next=decoded is not None,
+                          has_previous=has_previous)
+
+
+def attach_cursors(page_obj):
+    """Добавляет к странице курсоры соседних страниц для шаблона."""
+    paginator = page_obj.paginator
+    page_obj.next_cursor = page_obj.previous_cursor = ''
+    if len(page_obj):
+        page_obj.next_cursor = paginator.cursor_for(page_obj[-1])
+        page_obj.previous_cursor = paginator.cursor_for(page_obj[0])
     return page_obj
+
+
+def page_number(request):
+    """Номер из ?page=; дальше NUMBERED_PAGES страниц нет — только курсоры."""
+    try:
+        number = int(request.GET.get('page', 1))
+    except ValueError:
+        return 1
+    if number > NUMBERED_PAGES:
+        raise Http404('Дальние страницы открываются по курсору.')
+    return max(number, 1)
+
+
+def paginate(request, object_list, post_per_page, **kwargs):
+    paginator = KeysetPaginator(object_list, post_per_page, **kwargs)
+    if 'after' in request.GET:
+        page_obj = paginator.page_after(request.GET['after'])
+    elif 'before' in request.GET:
+        page_obj = paginator.page_before(request.GET['before'])
+    else:
+        page_obj = paginator.get_page(page_number(request))
+    return attach_cursors(page_obj)
+
+
+def lazy_paginate(request, object_list, post_per_page, **kwargs):
+    """Страница, которая обращается к БД, только если её читают.
+
+    Если фрагмент ленты взят из кэша, шаблон её не трогает
+    и запросы COUNT(*) и SELECT не выполняются вовсе. Номер
+    страницы проверяется сразу, чтобы 404 не возник при рендере.
+    """
+    page_number(request)
+    return SimpleLazyObject(
+        lambda: paginate(request, object_list, post_per_page, **kwargs))
+
+
+def bulk_create_in_chunks(model, objs, chunk_size=1000, **kwargs):
+    """bulk_create для генератора без загрузки всех объектов в память.
+
+    Внутри чанка размер пачки выбирает сам Django: на SQLite явный
+    batch_size в Django 2.2 не урезается до лимитов СУБД.
+    """
+    objs = iter(objs)
+    while True:
+        chunk = list(islice(objs, chunk_size))
+        if not chunk:
+            return
+        model.objects.bulk_create(chunk, **kwargs)
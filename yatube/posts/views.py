@@ -1,37 +1,82 @@
+from urllib.parse import urlencode
+
+from django.db.models import F
 from django.shortcuts import get_object_or_404, render, redirect
-from .models import Group, Post, User, Follow
-from .forms import PostForm, CommentForm
-from posts.utils import paginate
+from django.urls import reverse
+from .models import Comment, Group, GroupStats, Post, User, Follow
+from .forms import CommentForm, FollowListForm, PostForm
+from posts.follows import follow, follow_many, suggestions_for, unfollow
+from posts.search import search_posts
+from posts.stats import author_stats
+from posts.syndication import feed_response
+from posts.thumbnails import pregenerate
+from posts.timeline import FollowFeed
+from posts.conditional import (conditional_page, group_state, index_state,
+                               post_state, profile_state)
+from posts.caching import (FEED_CACHE_TIMEOUT, GROUPS_FEED, INDEX_FEED,
+                           feed_cache_key, group_feed, profile_feed)
+from posts.utils import (KeysetPaginator, attach_cursors, lazy_paginate,
+                         paginate)
 from django.contrib.auth.decorators import login_required
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_safe
 
 PAGE_FOR_LIST = 10
+COMMENTS_PER_PAGE = 20
 LETTERS_FOR_POST = 30
 
 
+def comments_page(request, post_id):
+    """Порция комментариев после курсора ?after=, всегда одним запросом."""
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author').only('text', 'created', 'author', 'author__username')
+    paginator = KeysetPaginator(comments, COMMENTS_PER_PAGE,
+                                key='created', descending=False)
+    return attach_cursors(paginator.page_after(request.GET.get('after', '')))
+
+
+@conditional_page(index_state)
 def index(request):
-    post_list = Post.objects.all()
-    page_obj = paginate(request, post_list, PAGE_FOR_LIST)
+    post_list = Post.objects.feed()
+    page_obj = lazy_paginate(request, post_list, PAGE_FOR_LIST)
     context = {
+        'feed_key': feed_cache_key(request, INDEX_FEED),
+        'feed_timeout': FEED_CACHE_TIMEOUT,
         'page_obj': page_obj, }
     return render(request, 'posts/index.html', context)
 
 
+def groups(request):
+    """Каталог групп из GroupStats: сначала те, где писали недавно."""
+    groups = GroupStats.objects.select_related('group').order_by(
+        F('last_post_at').desc(nulls_last=True), 'group__title')
+    context = {
+        'feed_key': feed_cache_key(request, GROUPS_FEED),
+        'feed_timeout': FEED_CACHE_TIMEOUT,
+        'groups': groups, }
+    return render(request, 'posts/groups.html', context)
+
+
+@conditional_page(group_state)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.groups.all()
-    page_obj = paginate(request, posts, PAGE_FOR_LIST)
+    posts = group.groups.feed()
+    page_obj = lazy_paginate(request, posts, PAGE_FOR_LIST)
     context = {
+        'feed_key': feed_cache_key(request, group_feed(group.pk)),
+        'feed_timeout': FEED_CACHE_TIMEOUT,
         'group': group,
         'page_obj': page_obj, }
     return render(request, 'posts/group_list.html', context)
 
 
+@conditional_page(profile_state)
 def profile(request, username):
     title = 'Профайл пользователя'
     author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
-    count_posts = posts.count()
-    page_obj = paginate(request, posts, PAGE_FOR_LIST)
+    posts = author.posts.feed()
+    count_posts = author_stats(author).posts_count
+    page_obj = lazy_paginate(request, posts, PAGE_FOR_LIST)
     status_of_client = request.user.is_authenticated
     request_for_follow = status_of_client and Follow.objects.filter(
         user=request.user,
@@ -40,19 +85,54 @@ def profile(request, username):
         'following': request_for_follow,
         'author': author,
         'count_posts': count_posts,
+        'feed_key': feed_cache_key(request, profile_feed(author.pk)),
+        'feed_timeout': FEED_CACHE_TIMEOUT,
         'page_obj': page_obj,
         'title': title, }
     return render(request, 'posts/profile.html', context)
 
 
+@require_safe
+@gzip_page
+@conditional_page(index_state)
+def index_feed(request):
+    return feed_response(
+        request, Post.objects.all(), [INDEX_FEED], title='Yatube',
+        link=reverse('posts:index'), description='Последние записи')
+
+
+@require_safe
+@gzip_page
+@conditional_page(group_state)
+def group_posts_feed(request, slug):
+    group = get_object_or_404(Group.objects.only('pk', 'title'), slug=slug)
+    return feed_response(
+        request, Post.objects.filter(group=group), [group_feed(group.pk)],
+        title=group.title, link=reverse('posts:group_posts', args=[slug]),
+        description=f'Записи группы {group.title}')
+
+
+@require_safe
+@gzip_page
+@conditional_page(profile_state)
+def profile_posts_feed(request, username):
+    author = get_object_or_404(User.objects.only('pk'), username=username)
+    return feed_response(
+        request, Post.objects.filter(author=author),
+        [profile_feed(author.pk)], title=username,
+        link=reverse('posts:profile', args=[username]),
+        description=f'Записи пользователя {username}')
+
+
+@conditional_page(post_state)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    all_posts = post.author.posts
-    count = all_posts.count()
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), pk=post_id)
+    count = author_stats(post.author).posts_count
     short_post = post.text[:LETTERS_FOR_POST]
     title = 'Пост'
     form = CommentForm()
-    comments = post.comments.all()
+    comments = comments_page(request, post.pk)
     context = {
         'form': form,
         'comments': comments,
@@ -63,6 +143,25 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    posts = search_posts(Post.objects.feed(), query)
+    page_obj = paginate(request, posts, PAGE_FOR_LIST)
+    context = {
+        'page_obj': page_obj,
+        'page_params': urlencode({'q': query}) + '&',
+        'query': query, }
+    return render(request, 'posts/search.html', context)
+
+
+def post_comments(request, post_id):
+    get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    context = {
+        'comments': comments_page(request, post_id),
+        'post_id': post_id, }
+    return render(request, 'posts/includes/comments.html', context)
+
+
 @login_required
 def post_create(request):
     form = PostForm(
@@ -72,6 +171,7 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        pregenerate(post.image)
         return redirect('posts:profile', request.user)
     return render(request, 'posts/post_create.html', {'form': form})
 
@@ -86,7 +186,9 @@ def edit_post(request, post_id):
         files=request.FILES or None,
         instance=post)
     if form.is_valid():
-        form.save()
+        post = form.save()
+        if 'image' in form.changed_data:
+            pregenerate(post.image)
         return redirect('posts:post_detail', post_id=post_id)
     context = {
         'post': post,
@@ -109,33 +211,31 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    author_posts_following = Post.objects.filter(
-        author__following__user=request.user)
-    page_obj = paginate(request, author_posts_following, PAGE_FOR_LIST)
+    page_obj = paginate(request, FollowFeed(request.user), PAGE_FOR_LIST)
     context = {
-        'page_obj': page_obj, }
+        'page_obj': page_obj,
+        'suggestions': suggestions_for(request.user), }
     return render(request, 'posts/follow.html', context)
 
 
+@login_required
+def follow_import(request):
+    form = FollowListForm(request.POST or None)
+    if form.is_valid():
+        follow_many(request.user, form.cleaned_data['usernames'])
+        return redirect('posts:follow_index')
+    return render(request, 'posts/follow_import.html', {'form': form})
+
+
 @login_required
 def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
-    if not Follow.objects.filter(
-        user=request.user,
-        author=author
-    ).exists() and request.user != author:
-        Follow.objects.create(
-            user=request.user,
-            author=get_object_or_404(User, username=username))
+    author = get_object_or_404(User.objects.only('pk'), username=username)
+    follow(request.user, author.pk)
     return redirect('posts:profile', username)
 
 
 @login_required
 def profile_unfollow(request, username):
-    if Follow.objects.filter(
-            user=request.user,
-            author=get_object_or_404(User, username=username)).exists():
-        Follow.objects.filter(
-            user=request.user,
-            author=get_object_or_404(User, username=username)).delete()
-        return redirect('posts:profile', username)
+    author = get_object_or_404(User.objects.only('pk'), username=username)
+    unfollow(request.user, author.pk)
+    return redirect('posts:profile', username)
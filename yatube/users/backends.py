@@ -0,0 +1,29 @@
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+
+USER_CACHE = 'users'
+
+
+def user_cache_key(user_id):
+    return f'auth-user:{user_id}'
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend, который отдаёт пользователя сессии из кэша.
+
+    AuthenticationMiddleware зовёт get_user на каждом запросе; копия
+    из кэша 'users' избавляет от SELECT по auth_user. Запись живёт
+    TIMEOUT секунд и удаляется при любом сохранении пользователя.
+    Кэш должен быть общим для всех процессов, иначе после смены
+    пароля другие процессы держат копию со старым хешем.
+    """
+
+    def get_user(self, user_id):
+        cache = caches[USER_CACHE]
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user)
+        return user
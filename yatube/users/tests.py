@@ -0,0 +1,89 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import _create_cache, caches
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .backends import USER_CACHE, user_cache_key
+
+User = get_user_model()
+
+
+@override_settings(
+    SESSION_ENGINE='django.contrib.sessions.backends.cached_db',
+    AUTHENTICATION_BACKENDS=['users.backends.CachedModelBackend'])
+class CachedSessionUserTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='gol43',
+                                            password='old-password-43')
+
+    def setUp(self):
+        caches[USER_CACHE].clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.url = reverse('posts:follow_index')
+
+    def test_session_and_user_come_from_cache(self):
+        """повторный запрос не читает django_session и auth_user"""
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        tables = ' '.join(query['sql'] for query in queries.captured_queries)
+        self.assertNotIn('django_session', tables)
+        self.assertNotIn('auth_user"."password', tables)
+
+    def test_password_change_drops_cached_user(self):
+        """после смены пароля старая сессия больше не пускает"""
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password('new-password-43')
+        user.save()
+        response = self.client.get(self.url)
+        self.assertRedirects(
+            response, f'{reverse("users:login")}?next={self.url}')
+
+
+@override_settings(AUTHENTICATION_BACKENDS=[
+    'users.backends.CachedModelBackend'])
+class SharedUserCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.cache_dir = tempfile.mkdtemp()
+        cls.user = User.objects.create_user(username='gol43',
+                                            password='old-password-43')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.cache_dir, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_password_change_reaches_other_processes(self):
+        """копия пользователя в другом процессе сбрасывается при сохранении"""
+        shared = {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': self.cache_dir,
+            'TIMEOUT': 60,
+        }
+        url = reverse('posts:follow_index')
+        with self.settings(CACHES={**settings.CACHES, 'users': shared}):
+            # Второй воркер успел закэшировать пользователя со старым хешем.
+            other_process = _create_cache(USER_CACHE)
+            key = user_cache_key(self.user.pk)
+            other_process.set(key, User.objects.get(pk=self.user.pk))
+            user = User.objects.get(pk=self.user.pk)
+            user.set_password('new-password-43')
+            user.save()
+            self.assertIsNone(other_process.get(key))
+            # Вход с новым паролем не сбрасывается устаревшей копией.
+            client = Client()
+            client.force_login(user)
+            self.assertEqual(client.get(url).status_code, 200)
+            self.assertEqual(client.get(url).status_code, 200)
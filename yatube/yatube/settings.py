@@ -41,6 +41,7 @@ INSTALLED_APPS = [
     'core.apps.CoreConfig',
     'users.apps.UsersConfig',
     'posts.apps.PostsConfig',
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -50,11 +51,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.StaticFilesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -84,13 +88,109 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# По умолчанию SQLite рядом с проектом; в продакшене PostgreSQL через
+# переменные окружения. DB_REPLICAS — через запятую хосты реплик
+# (для SQLite — пути к файлам-копиям основной базы).
+DB_ENGINE = os.getenv('DB_ENGINE', 'django.db.backends.sqlite3')
+DB_IS_SQLITE = DB_ENGINE.endswith('sqlite3')
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'ENGINE': DB_ENGINE,
+        'NAME': os.getenv('DB_NAME', os.path.join(BASE_DIR, 'db.sqlite3')),
+        'USER': os.getenv('DB_USER', ''),
+        'PASSWORD': os.getenv('DB_PASSWORD', ''),
+        'HOST': os.getenv('DB_HOST', ''),
+        'PORT': os.getenv('DB_PORT', ''),
+        'CONN_MAX_AGE': int(os.getenv(
+            'DB_CONN_MAX_AGE', 0 if DB_IS_SQLITE else 60)),
     }
 }
 
+for number, replica in enumerate(
+        filter(None, os.getenv('DB_REPLICAS', '').split(','))):
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'NAME' if DB_IS_SQLITE else 'HOST': replica.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['core.routers.PrimaryReplicaRouter']
+
+# Представления, которые читают с реплик (core.middleware).
+REPLICA_VIEWS = [
+    'posts:index',
+    'posts:group_posts',
+    'posts:profile',
+    'posts:post_detail',
+    'posts:post_comments',
+    'posts:follow_index',
+    'posts:search',
+    'api:index',
+    'api:group_posts',
+    'api:profile',
+    'api:post_detail',
+    'api:post_comments',
+    'api:follow_index',
+]
+# Столько секунд после записи пользователь, а после сдвига версии
+# ленты (posts.caching) и все зрители этой ленты читают с default.
+REPLICA_PIN_SECONDS = 10
+
+# Версии лент и фрагменты (posts.caching) и записи миниатюр должны быть
+# общими для всех процессов: версию, сдвинутую в одном воркере, иначе
+# не видят остальные. В продакшене CACHE_BACKEND и CACHE_LOCATION
+# указывают на memcached, Redis (django-redis) или каталог
+# FileBasedCache; LocMemCache годится только для одного процесса
+# (runserver, тесты), о чём предупреждает manage.py check --deploy.
+CACHE_BACKEND = os.getenv(
+    'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+CACHE_LOCATION = os.getenv('CACHE_LOCATION', '')
+
+
+def shared_cache(prefix, max_entries=None, **params):
+    """Кэш на общем бэкенде; KEY_PREFIX разводит ключи разных кэшей."""
+    cache = {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': CACHE_LOCATION or prefix,
+        'KEY_PREFIX': prefix,
+        **params,
+    }
+    # MAX_ENTRIES понимают только LocMemCache и FileBasedCache.
+    if max_entries and CACHE_BACKEND.endswith(
+            ('LocMemCache', 'FileBasedCache')):
+        cache['OPTIONS'] = {'MAX_ENTRIES': max_entries}
+    return cache
+
+
+CACHES = {
+    'default': shared_cache('default'),
+    # Записи миниатюр sorl.
+    'thumbnails': shared_cache('thumbnails', 100000, TIMEOUT=None),
+    'sessions': shared_cache('sessions', 100000),
+    # Пользователи сессий (users.backends). Кэш общий: сохранение
+    # пользователя сбрасывает запись сразу во всех процессах.
+    'users': shared_cache('users', TIMEOUT=60),
+}
+
+# На общем кэше сессии читаются из него, в БД пишутся только изменения.
+# В LocMemCache так нельзя: выход (flush) удалил бы сессию из кэша
+# только своего процесса, и остальные пускали бы по ней ещё две недели.
+# Совсем без БД: 'django.contrib.sessions.backends.signed_cookies'.
+SESSION_ENGINE = os.getenv(
+    'SESSION_ENGINE',
+    'django.contrib.sessions.backends.'
+    + ('db' if CACHE_BACKEND.endswith('LocMemCache') else 'cached_db'))
+SESSION_CACHE_ALIAS = 'sessions'
+
+# Пользователь из кэша только на общем бэкенде: в LocMemCache другие
+# процессы держали бы копию со старым хешем пароля и после его смены
+# пускали бы старые сессии, а новую сбрасывали бы.
+AUTHENTICATION_BACKENDS = [
+    'django.contrib.auth.backends.ModelBackend'
+    if CACHE_BACKEND.endswith('LocMemCache')
+    else 'users.backends.CachedModelBackend']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -130,6 +230,12 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
+STATIC_ROOT = os.path.join(BASE_DIR, 'collected_static')
+# collectstatic пишет имена с хешем содержимого, манифест и .gz/.br копии.
+STATICFILES_STORAGE = 'core.storage.CompressedManifestStorage'
+# Без отладки статику из STATIC_ROOT отдаёт core.middleware; за CDN или
+# nginx это можно выключить.
+STATIC_SERVE = not DEBUG
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -139,5 +245,33 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+# Заголовок Server-Timing (core.middleware) выдаёт имена представлений
+# и число запросов, поэтому без отладки его видят только сотрудники.
+# Журнал медленных запросов пишется всегда.
+SERVER_TIMING = DEBUG
+# Пороги журнала медленных запросов (core.middleware).
+SLOW_REQUEST_MS = 500
+SLOW_REQUEST_QUERIES = 50
+SLOW_REQUEST_TOP_QUERIES = 5
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Кто отдаёт MEDIA_URL (core.media): 'python' — сам Django с Range и
+# sendfile через wsgi.file_wrapper; 'x-accel-redirect' (nginx) или
+# 'x-sendfile' (Apache) — веб-сервер по заголовку; None — маршрута нет.
+MEDIA_SERVE = 'python'
+# internal location в nginx, смотрящий в MEDIA_ROOT.
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+# Имена с хешем содержимого (posts.images) кэшируются навсегда.
+MEDIA_IMMUTABLE = r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.\w+$'
+
+# Миниатюры режутся в пуле потоков, шаблоны только читают готовые.
+# THUMBNAIL_WORKERS = 0 — без пула: нарезка сразу после фиксации.
+THUMBNAIL_BACKEND = 'posts.thumbnails.DeferredThumbnailBackend'
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_KVSTORE = 'posts.thumbnails.CacheKVStore'
+THUMBNAIL_CACHE = 'thumbnails'
+
+# Загрузки перекодируются не больше чем в IMAGE_WORKERS потоках сразу;
+# 0 — обрабатывать прямо в запросе.
+IMAGE_WORKERS = 2